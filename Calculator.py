@@ -1,9 +1,38 @@
-import tkinter as tk
-import math
+import sys
+
+import calc_engine
+from calc_history import History, IncrementalEvaluator
+
+# tkinter is only imported once a window is opened, so scripts and the
+# batch mode start without it (and without a display).
+tk = None
+
+
+def load_tk():
+    global tk
+    if tk is None:
+        import tkinter
+        tk = tkinter
+    return tk
+
+
+def calculate_text(text, backend="float", precision=calc_engine.DEFAULT_PRECISION):
+    try:
+        return str(calc_engine.evaluate(text, backend=backend, precision=precision))
+    except Exception:
+        # Any failure is this line's "Error"; a batch carries on with the next.
+        return "Error"
+
 
 class Calculator:
-    def __init__(self, master):
+    def __init__(self, master, backend="float", precision=calc_engine.DEFAULT_PRECISION):
+        load_tk()
         self.master = master
+        self.backend = backend
+        self.precision = precision
+        self.evaluator = IncrementalEvaluator(backend, precision)
+        self.history = History()
+        self.history_index = len(self.history)
         master.title("Calculator")
         master.configure(bg='#f0f0f0')
 
@@ -76,42 +105,91 @@ class Calculator:
             self.entry.insert(0, "Error")
 
     def apply_function(self, func):
-        try:
-            value = float(self.entry.get())
-            if func == 'sqrt':
-                result = math.sqrt(value)
-            elif func == 'sin':
-                result = math.sin(math.radians(value))
-            elif func == 'cos':
-                result = math.cos(math.radians(value))
-            elif func == 'tan':
-                result = math.tan(math.radians(value))
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, str(result))
-        except ValueError:
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, "Error")
+        result = calculate_text(f"{func}({self.entry.get()})", self.backend, self.precision)
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, result)
 
     def calculate(self):
+        text = self.entry.get()
         try:
-            result = eval(self.entry.get())
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, str(result))
-        except Exception as e:
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, "Error")
+            result = str(self.evaluator.evaluate(text))
+        except Exception:
+            result = "Error"
+        else:
+            self.history.add(text, result)
+        self.history_index = len(self.history)
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, result)
+
+    def recall(self, step):
+        # Up/Down walk back through earlier expressions, like a shell.
+        if not len(self.history):
+            return
+        self.history_index = min(max(self.history_index + step, 0), len(self.history))
+        self.entry.delete(0, tk.END)
+        if self.history_index < len(self.history):
+            self.entry.insert(0, self.history[self.history_index]["expression"])
 
     def bind_keys(self):
         self.master.bind('<Return>', lambda event: self.calculate())
         self.master.bind('<BackSpace>', lambda event: self.backspace())
+        self.master.bind('<Up>', lambda event: self.recall(-1))
+        self.master.bind('<Down>', lambda event: self.recall(1))
         for key in '0123456789+-*/().':
             self.master.bind(key, lambda event, digit=key: self.entry.insert(tk.END, digit))
 
-if __name__ == "__main__":
-    root = tk.Tk()
-    calculator = Calculator(root)
+def run_gui(backend="float", precision=calc_engine.DEFAULT_PRECISION):
+    root = load_tk().Tk()
+    calculator = Calculator(root, backend, precision)
     for i in range(6):  # 6 rows including the entry field
         root.grid_rowconfigure(i, weight=1)
     for i in range(5):  # 5 columns
         root.grid_columnconfigure(i, weight=1)
     root.mainloop()
+
+
+def run_batch(source, out, backend="float", precision=calc_engine.DEFAULT_PRECISION):
+    # One expression per line in, one result per line out. Blank lines are
+    # echoed so the output stays line-aligned with the input.
+    write = out.write
+    for line in source:
+        write(calculate_text(line, backend, precision) + "\n" if line.strip() else "\n")
+
+
+def run_repl(backend="float", precision=calc_engine.DEFAULT_PRECISION):
+    while True:
+        try:
+            text = input("> ")
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return
+        if text.strip() in ("quit", "exit"):
+            return
+        if text.strip():
+            print(calculate_text(text, backend, precision))
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Calculator (opens the window when run without options)")
+    parser.add_argument("-e", "--expression", action="append", help="evaluate and print, may repeat")
+    parser.add_argument("--repl", action="store_true", help="interactive prompt in the terminal")
+    parser.add_argument("--batch", action="store_true", help="evaluate stdin, one expression per line")
+    parser.add_argument("--backend", choices=calc_engine.BACKENDS, default="float")
+    parser.add_argument("--precision", type=int, default=calc_engine.DEFAULT_PRECISION,
+                        help="significant digits for the decimal backend")
+    args = parser.parse_args(argv)
+
+    if args.expression:
+        for text in args.expression:
+            print(calculate_text(text, args.backend, args.precision))
+    elif args.batch:
+        run_batch(sys.stdin, sys.stdout, args.backend, args.precision)
+    elif args.repl:
+        run_repl(args.backend, args.precision)
+    else:
+        run_gui(args.backend, args.precision)
+
+
+if __name__ == "__main__":
+    main()
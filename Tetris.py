@@ -1,26 +1,19 @@
 import pygame
-import random
 import json
 import os
 
+from tetris_engine import (BLACK, CYAN, YELLOW, MAGENTA, RED, GREEN, BLUE, ORANGE, GRID_WIDTH, GRID_HEIGHT,
+                           DEFAULT_SPEED, LEFT, RIGHT, DOWN, ROTATE, DROP, HOLD, TICK, TetrisEngine)
+from tetris_ai import Player
+
 pygame.init()
 
 # Colors
-BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 GRAY = (128, 128, 128)
-CYAN = (0, 255, 255)
-YELLOW = (255, 255, 0)
-MAGENTA = (255, 0, 255)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BLUE = (0, 0, 255)
-ORANGE = (255, 165, 0)
 
 # Game dimensions
 BLOCK_SIZE = 30
-GRID_WIDTH = 10
-GRID_HEIGHT = 20
 PLAY_WIDTH = BLOCK_SIZE * GRID_WIDTH
 PLAY_HEIGHT = BLOCK_SIZE * GRID_HEIGHT
 SIDEBAR_WIDTH = 200
@@ -32,84 +25,44 @@ PREVIEW_SIZE = 4
 PREVIEW_OFFSET_X = PLAY_WIDTH + SIDEBAR_WIDTH + 20
 PREVIEW_OFFSET_Y = 50
 
-# Tetromino shapes
-SHAPES = [
-    [[1, 1, 1, 1]],
-    [[1, 1], [1, 1]],
-    [[1, 1, 1], [0, 1, 0]],
-    [[1, 1, 1], [1, 0, 0]],
-    [[1, 1, 1], [0, 0, 1]],
-    [[1, 1, 0], [0, 1, 1]],
-    [[0, 1, 1], [1, 1, 0]]
-]
-
-COLORS = [CYAN, YELLOW, MAGENTA, RED, GREEN, BLUE, ORANGE]
-
 CUSTOM_COLORS = {
     'cyan': CYAN, 'yellow': YELLOW, 'magenta': MAGENTA,
     'red': RED, 'green': GREEN, 'blue': BLUE, 'orange': ORANGE
 }
 
-DEFAULT_SPEED = 5
-
-class Tetromino:
-    def __init__(self, shape=None):
-        self.shape = shape or random.choice(SHAPES)
-        self.color = random.choice(COLORS)
-        self.x = GRID_WIDTH // 2 - len(self.shape[0]) // 2
-        self.y = 0
-        self.rotation = 0
-
-    def move(self, dx, dy):
-        self.x += dx
-        self.y += dy
-
-    def rotate(self):
-        self.shape = list(zip(*self.shape[::-1]))
-        self.rotation = (self.rotation + 1) % 4
-
-    def undo_rotate(self):
-        for _ in range(3):
-            self.rotate()
+KEY_ACTIONS = {
+    pygame.K_LEFT: LEFT,
+    pygame.K_RIGHT: RIGHT,
+    pygame.K_DOWN: DOWN,
+    pygame.K_UP: ROTATE,
+    pygame.K_SPACE: DROP,
+    pygame.K_c: HOLD,
+}
 
-class TetrisGame:
+class TetrisGame(TetrisEngine):
     def __init__(self):
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
         pygame.display.set_caption("Tetris")
         self.clock = pygame.time.Clock()
         self.font = pygame.font.Font(None, 36)
+        self.big_font = pygame.font.Font(None, 64)
+        self.text_cache = {}
+        self.tiles = {}
         self.load_settings()
         self.load_high_scores()
-        self.reset_game()
+        super().__init__(speed=self.game_speed)
         self.fullscreen = False
+        self.player = Player()
+        self.autoplay = False
+        self.plan = []
+        self.invalidate()
 
     def reset_game(self):
-        self.grid = [[BLACK for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.bag = self.generate_bag()
-        self.current_piece = self.get_next_piece()
-        self.next_pieces = [self.get_next_piece() for _ in range(3)]
-        self.hold_piece = None
-        self.can_hold = True
-        self.game_over = False
-        self.score = 0
-        self.level = 1
-        self.lines_cleared = 0
+        super().reset_game()
         self.paused = False
-        self.combo = 0
-        self.last_move_was_tetris = False
         self.show_ghost = True
         self.show_instructions = True
 
-    def generate_bag(self):
-        bag = list(range(len(SHAPES)))
-        random.shuffle(bag)
-        return bag
-
-    def get_next_piece(self):
-        if not self.bag:
-            self.bag = self.generate_bag()
-        return Tetromino(SHAPES[self.bag.pop()])
-
     def load_settings(self):
         if os.path.exists('settings.json'):
             with open('settings.json', 'r') as f:
@@ -142,167 +95,156 @@ class TetrisGame:
         with open('high_scores.json', 'w') as f:
             json.dump(self.high_scores, f)
 
-    def draw_grid(self):
-        pygame.draw.rect(self.screen, WHITE, (SIDEBAR_WIDTH - 1, -1, PLAY_WIDTH + 2, PLAY_HEIGHT + 2), 2)
-        
-        for y, row in enumerate(self.grid):
-            for x, color in enumerate(row):
-                pygame.draw.rect(self.screen, color, 
-                                 (SIDEBAR_WIDTH + x * BLOCK_SIZE, y * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE), 0)
-                pygame.draw.rect(self.screen, GRAY, 
+    # Drawing is incremental: the background (borders and the empty grid) is
+    # drawn once, each frame works out what every playfield cell should show
+    # and redraws only the cells that differ from last frame, and each side
+    # panel is redrawn only when the values it shows change. Only those
+    # rectangles are passed to pygame.display.update.
+    def invalidate(self):
+        # Next frame redraws everything: after a resize, or after another
+        # screen has drawn over the window.
+        self.background = self.build_background()
+        self.shown = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
+        self.panel_keys = {}
+        self.overlay = None
+        self.full_redraw = True
+
+    def build_background(self):
+        background = pygame.Surface(self.screen.get_size())
+        background.fill(BLACK)
+        pygame.draw.rect(background, WHITE, (SIDEBAR_WIDTH - 1, -1, PLAY_WIDTH + 2, PLAY_HEIGHT + 2), 2)
+        for y in range(GRID_HEIGHT):
+            for x in range(GRID_WIDTH):
+                pygame.draw.rect(background, GRAY,
                                  (SIDEBAR_WIDTH + x * BLOCK_SIZE, y * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE), 1)
+        return background.convert()
+
+    def render_text(self, text, font=None):
+        font = font or self.font
+        key = (text, id(font))
+        surface = self.text_cache.get(key)
+        if surface is None:
+            if len(self.text_cache) > 256:
+                self.text_cache.clear()
+            surface = self.text_cache[key] = font.render(text, True, WHITE)
+        return surface
+
+    def cell_tile(self, state):
+        # A settled cell is its colour inside the grey outline; the falling
+        # piece and its ghost are solid blocks.
+        tile = self.tiles.get(state)
+        if tile is None:
+            tile = self.tiles[state] = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE))
+            if state[0] == 'solid':
+                tile.fill(state[1])
+            else:
+                tile.fill(state)
+                pygame.draw.rect(tile, GRAY, (0, 0, BLOCK_SIZE, BLOCK_SIZE), 1)
+        return tile
+
+    def draw_cells(self, dirty):
+        cells = [list(row) for row in self.grid]
+        piece = self.current_piece
+        if self.show_ghost:
+            ghost_y = piece.y + self.drop_distance(piece)
+            for x, y in piece.cells:
+                if 0 <= ghost_y + y < GRID_HEIGHT:
+                    cells[ghost_y + y][piece.x + x] = ('solid', GRAY)
+        for x, y in piece.cells:
+            if 0 <= piece.y + y < GRID_HEIGHT:
+                cells[piece.y + y][piece.x + x] = ('solid', piece.color)
+
+        for y, (row, shown) in enumerate(zip(cells, self.shown)):
+            if row == shown:
+                continue
+            for x, state in enumerate(row):
+                if state != shown[x]:
+                    rect = pygame.Rect(SIDEBAR_WIDTH + x * BLOCK_SIZE, y * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
+                    if state == BLACK:
+                        self.screen.blit(self.background, rect, rect)
+                    else:
+                        self.screen.blit(self.cell_tile(state), rect)
+                    dirty.append(rect)
+            self.shown[y] = row
 
-    def draw_piece(self, piece, offset_x=0, offset_y=0):
-        for y, row in enumerate(piece.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    pygame.draw.rect(self.screen, piece.color,
-                                     (SIDEBAR_WIDTH + (piece.x + x + offset_x) * BLOCK_SIZE,
-                                      (piece.y + y + offset_y) * BLOCK_SIZE,
-                                      BLOCK_SIZE, BLOCK_SIZE), 0)
-
-    def draw_ghost_piece(self):
-        if not self.show_ghost:
+    def draw_panel(self, dirty, name, rect, key, draw):
+        if self.panel_keys.get(name) == key:
             return
-        ghost_piece = Tetromino(self.current_piece.shape)
-        ghost_piece.x, ghost_piece.y = self.current_piece.x, self.current_piece.y
-        while not self.check_collision(ghost_piece, 0, 1):
-            ghost_piece.y += 1
-        ghost_piece.y -= 1
-        for y, row in enumerate(ghost_piece.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    pygame.draw.rect(self.screen, (*GRAY, 128),
-                                     (SIDEBAR_WIDTH + (ghost_piece.x + x) * BLOCK_SIZE,
-                                      (ghost_piece.y + y) * BLOCK_SIZE,
-                                      BLOCK_SIZE, BLOCK_SIZE), 0)
+        self.panel_keys[name] = key
+        rect = pygame.Rect(rect).clip(self.screen.get_rect())
+        self.screen.blit(self.background, rect, rect)
+        draw()
+        dirty.append(rect)
+
+    def render(self):
+        overlay = ('game over', self.score) if self.game_over else 'paused' if self.paused else None
+        if overlay != self.overlay:
+            self.invalidate()
+            self.overlay = overlay
+        width, height = self.screen.get_size()
+        dirty = []
+        if self.full_redraw:
+            self.screen.blit(self.background, (0, 0))
+        self.draw_cells(dirty)
+        self.draw_panel(dirty, 'hold', (0, 0, SIDEBAR_WIDTH - 1, height),
+                        (self.hold_piece and (self.hold_piece.shape_id, self.hold_piece.rotation, self.hold_piece.color),
+                         self.score, self.level),
+                        lambda: (self.draw_hold_piece(), self.draw_score_and_level()))
+        self.draw_panel(dirty, 'next', (PLAY_WIDTH + SIDEBAR_WIDTH + 1, 0, SIDEBAR_WIDTH - 1, height),
+                        tuple((piece.shape_id, piece.rotation, piece.color) for piece in self.next_pieces),
+                        self.draw_next_pieces)
+        self.draw_panel(dirty, 'instructions', (SCREEN_WIDTH - INSTRUCTIONS_WIDTH, 0, width, height),
+                        self.show_instructions,
+                        lambda: self.show_instructions and self.draw_instructions())
+        if overlay is not None and dirty and not self.full_redraw:
+            # Something changed under the overlay text: start over.
+            self.invalidate()
+            self.overlay = overlay
+            return self.render()
+        if self.full_redraw:
+            # The overlay text is only ever drawn over a fresh frame.
+            if self.game_over:
+                self.draw_game_over()
+            elif self.paused:
+                pause_text = self.render_text("PAUSED")
+                self.screen.blit(pause_text, (SCREEN_WIDTH // 2 - pause_text.get_width() // 2, SCREEN_HEIGHT // 2))
+            self.full_redraw = False
+            pygame.display.update(self.screen.get_rect())
+        elif dirty:
+            pygame.display.update(dirty)
 
     def draw_next_pieces(self):
-        preview_text = self.font.render("Next:", True, WHITE)
+        preview_text = self.render_text("Next:")
         self.screen.blit(preview_text, (PREVIEW_OFFSET_X, 10))
         
         for i, piece in enumerate(self.next_pieces):
-            for y, row in enumerate(piece.shape):
-                for x, cell in enumerate(row):
-                    if cell:
-                        pygame.draw.rect(self.screen, piece.color,
-                                         (PREVIEW_OFFSET_X + x * BLOCK_SIZE,
-                                          PREVIEW_OFFSET_Y + (i * 4 + y) * BLOCK_SIZE,
-                                          BLOCK_SIZE, BLOCK_SIZE), 0)
+            for x, y in piece.cells:
+                pygame.draw.rect(self.screen, piece.color,
+                                 (PREVIEW_OFFSET_X + x * BLOCK_SIZE,
+                                  PREVIEW_OFFSET_Y + (i * 4 + y) * BLOCK_SIZE,
+                                  BLOCK_SIZE, BLOCK_SIZE), 0)
 
     def draw_hold_piece(self):
-        hold_text = self.font.render("Hold:", True, WHITE)
+        hold_text = self.render_text("Hold:")
         self.screen.blit(hold_text, (10, 10))
         
         if self.hold_piece:
-            for y, row in enumerate(self.hold_piece.shape):
-                for x, cell in enumerate(row):
-                    if cell:
-                        pygame.draw.rect(self.screen, self.hold_piece.color,
-                                         (10 + x * BLOCK_SIZE,
-                                          50 + y * BLOCK_SIZE,
-                                          BLOCK_SIZE, BLOCK_SIZE), 0)
-
-    def check_collision(self, piece, dx=0, dy=0):
-        for y, row in enumerate(piece.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    new_x = piece.x + x + dx
-                    new_y = piece.y + y + dy
-                    if (new_x < 0 or new_x >= GRID_WIDTH or
-                        new_y >= GRID_HEIGHT or
-                        (new_y >= 0 and self.grid[new_y][new_x] != BLACK)):
-                        return True
-        return False
-
-    def merge_piece(self):
-        for y, row in enumerate(self.current_piece.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    self.grid[self.current_piece.y + y][self.current_piece.x + x] = self.current_piece.color
-
-    def remove_full_rows(self):
-        full_rows = [i for i, row in enumerate(self.grid) if all(cell != BLACK for cell in row)]
-        for row in full_rows:
-            del self.grid[row]
-            self.grid.insert(0, [BLACK for _ in range(GRID_WIDTH)])
-        
-        lines_cleared = len(full_rows)
-        self.lines_cleared += lines_cleared
-        self.update_score(lines_cleared)
-        
-        self.level = self.lines_cleared // 10 + 1
-        self.game_speed = min(DEFAULT_SPEED + self.level - 1, 20)
-
-    def update_score(self, lines_cleared):
-        line_scores = [100, 300, 500, 800]
-        if lines_cleared > 0:
-            score = line_scores[lines_cleared - 1] * self.level
-            if lines_cleared == 4:
-                if self.last_move_was_tetris:
-                    score *= 1.5  # Back-to-back Tetris bonus
-                self.last_move_was_tetris = True
-            else:
-                self.last_move_was_tetris = False
-            
-            self.combo += 1
-            score += (50 * self.combo * self.level)  # Combo bonus
-            
-            self.score += int(score)
-        else:
-            self.combo = 0
-            self.last_move_was_tetris = False
-
-    def hard_drop(self):
-        while not self.check_collision(self.current_piece, 0, 1):
-            self.current_piece.move(0, 1)
-        self.merge_piece()
-        self.remove_full_rows()
-        self.new_piece()
-
-    def hold(self):
-        if self.can_hold:
-            if self.hold_piece:
-                self.hold_piece, self.current_piece = self.current_piece, self.hold_piece
-                self.current_piece.x = GRID_WIDTH // 2 - len(self.current_piece.shape[0]) // 2
-                self.current_piece.y = 0
-            else:
-                self.hold_piece = self.current_piece
-                self.new_piece()
-            self.can_hold = False
-
-    def new_piece(self):
-        self.current_piece = self.next_pieces.pop(0)
-        self.next_pieces.append(self.get_next_piece())
-        if self.check_collision(self.current_piece):
-            self.game_over = True
-        self.can_hold = True
-
-    def wall_kick(self, piece, rotation):
-        kicks = [
-            [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
-            [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
-            [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
-            [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)]
-        ]
-        for dx, dy in kicks[rotation]:
-            if not self.check_collision(piece, dx, dy):
-                piece.x += dx
-                piece.y += dy
-                return True
-        return False
+            for x, y in self.hold_piece.cells:
+                pygame.draw.rect(self.screen, self.hold_piece.color,
+                                 (10 + x * BLOCK_SIZE,
+                                  50 + y * BLOCK_SIZE,
+                                  BLOCK_SIZE, BLOCK_SIZE), 0)
 
     def draw_score_and_level(self):
-        score_text = self.font.render(f"Score: {self.score}", True, WHITE)
-        level_text = self.font.render(f"Level: {self.level}", True, WHITE)
+        score_text = self.render_text(f"Score: {self.score}")
+        level_text = self.render_text(f"Level: {self.level}")
         self.screen.blit(score_text, (10, 150))
         self.screen.blit(level_text, (10, 190))
 
     def draw_game_over(self):
-        game_over_font = pygame.font.Font(None, 64)
-        game_over_text = game_over_font.render("GAME OVER", True, WHITE)
-        score_text = self.font.render(f"Final Score: {self.score}", True, WHITE)
-        restart_text = self.font.render("Press ENTER for High Scores", True, WHITE)
+        game_over_text = self.render_text("GAME OVER", self.big_font)
+        score_text = self.render_text(f"Final Score: {self.score}")
+        restart_text = self.render_text("Press ENTER for High Scores")
         
         self.screen.blit(game_over_text, (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, SCREEN_HEIGHT // 2 - 100))
         self.screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, SCREEN_HEIGHT // 2))
@@ -331,6 +273,7 @@ class TetrisGame:
 
         self.custom_colors = [CUSTOM_COLORS[color_names[current_color]]] * 7
         self.save_settings()
+        self.invalidate()
 
     def draw_instructions(self):
         instructions = [
@@ -343,24 +286,34 @@ class TetrisGame:
             "G: Toggle ghost piece",
             "+/-: Adjust speed",
             "R: Restart (when game over)",
-            "F: Toggle full-screen"
+            "F: Toggle full-screen",
+            "A: Toggle autoplay"
         ]
         for i, instruction in enumerate(instructions):
-            text = self.font.render(instruction, True, WHITE)
+            text = self.render_text(instruction)
             self.screen.blit(text, (SCREEN_WIDTH - INSTRUCTIONS_WIDTH + 10, 50 + i * 30))
 
+    def autoplay_step(self):
+        # One planned action per frame, so the moves can be followed; the
+        # plan ends in a hard drop, and the next piece gets a new one.
+        if not self.plan:
+            self.plan = list(self.player.choose(self) or [DROP])
+        self.step(self.plan.pop(0))
+
     def toggle_fullscreen(self):
         self.fullscreen = not self.fullscreen
         if self.fullscreen:
             self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
         else:
             self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
+        self.invalidate()
 
     def handle_resize(self, event):
         if not self.fullscreen:
             new_width = max(event.w, SCREEN_WIDTH)
             new_height = max(event.h, SCREEN_HEIGHT)
             self.screen = pygame.display.set_mode((new_width, new_height), pygame.RESIZABLE)
+            self.invalidate()
 
     def run(self):
         drop_time = 0
@@ -388,53 +341,27 @@ class TetrisGame:
                         self.save_settings()
                     elif event.key == pygame.K_i:
                         self.show_instructions = not self.show_instructions
+                    elif event.key == pygame.K_a:
+                        self.autoplay = not self.autoplay
+                        self.plan = []
                     elif not self.paused and not self.game_over:
-                        if event.key == pygame.K_LEFT:
-                            if not self.check_collision(self.current_piece, -1, 0):
-                                self.current_piece.move(-1, 0)
-                        elif event.key == pygame.K_RIGHT:
-                            if not self.check_collision(self.current_piece, 1, 0):
-                                self.current_piece.move(1, 0)
-                        elif event.key == pygame.K_DOWN:
-                            if not self.check_collision(self.current_piece, 0, 1):
-                                self.current_piece.move(0, 1)
-                        elif event.key == pygame.K_UP:
-                            self.current_piece.rotate()
-                            if self.check_collision(self.current_piece):
-                                if not self.wall_kick(self.current_piece, self.current_piece.rotation):
-                                    self.current_piece.undo_rotate()
-                        elif event.key == pygame.K_SPACE:
-                            self.hard_drop()
-                        elif event.key == pygame.K_c:
-                            self.hold()
+                        if event.key in KEY_ACTIONS:
+                            self.step(KEY_ACTIONS[event.key])
+                            self.plan = []
                     if event.key == pygame.K_r and self.game_over:
                         self.reset_game()
 
-            if not self.paused and not self.game_over:
+            if self.autoplay and not self.paused and not self.game_over:
+                self.autoplay_step()
+            elif not self.paused and not self.game_over:
                 drop_time += self.clock.get_rawtime()
                 if drop_time > 1000 // self.game_speed:
-                    if not self.check_collision(self.current_piece, 0, 1):
-                        self.current_piece.move(0, 1)
-                    else:
-                        self.merge_piece()
-                        self.remove_full_rows()
-                        self.new_piece()
+                    self.step(TICK)
                     drop_time = 0
 
-            self.screen.fill(BLACK)
-            self.draw_grid()
-            if self.show_ghost:
-                self.draw_ghost_piece()
-            self.draw_piece(self.current_piece)
-            self.draw_next_pieces()
-            self.draw_hold_piece()
-            self.draw_score_and_level()
-
-            if self.show_instructions:
-                self.draw_instructions()
+            self.render()
 
             if self.game_over:
-                self.draw_game_over()
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
                     self.update_high_scores()
                     while True:
@@ -450,11 +377,8 @@ class TetrisGame:
                             pygame.display.flip()
                             continue
                         break
-            elif self.paused:
-                pause_text = self.font.render("PAUSED", True, WHITE)
-                self.screen.blit(pause_text, (SCREEN_WIDTH // 2 - pause_text.get_width() // 2, SCREEN_HEIGHT // 2))
+                    self.invalidate()
 
-            pygame.display.flip()
             self.clock.tick(60)
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+import argparse
+import time
+
+import calc_engine
+
+EXPRESSIONS = [
+    "2+3*4",
+    "(1+2)*(3+4)/5",
+    "sqrt(16)+sin(30)*cos(60)",
+    "2**10-1000//3%7",
+    "-(3.5*2)+tan(45)",
+]
+
+
+def time_loop(function, count):
+    start = time.perf_counter()
+    function(count)
+    return count / (time.perf_counter() - start)
+
+
+def bench_cached(count):
+    evaluate = calc_engine.evaluate
+    expressions = EXPRESSIONS * (count // len(EXPRESSIONS))
+    for text in expressions:
+        evaluate(text)
+
+
+def bench_uncached(count):
+    for i in range(count):
+        calc_engine.compile_expression.cache_clear()
+        calc_engine.compile_normalized.cache_clear()
+        calc_engine.evaluate(EXPRESSIONS[i % len(EXPRESSIONS)])
+
+
+def long_expression(terms):
+    parts = ["sqrt(16)", "sin(30)*cos(60)", "1/3", "2**10//7", "0.1*-3.5", "(1+2)*(3+4)/5"]
+    return "+".join(parts[i % len(parts)] for i in range(terms))
+
+
+def bench_backend(backend, precision, text, count):
+    # Compiles once, like the cache would, then times evaluation alone.
+    expression = calc_engine.compile_tree(calc_engine.parse(text),
+                                          calc_engine.backend_functions(backend, precision))
+    start = time.perf_counter()
+    for _ in range(count):
+        expression(None)
+    return count / (time.perf_counter() - start)
+
+
+def bench_eval(count):
+    namespace = {"sqrt": calc_engine.FLOAT_FUNCTIONS["sqrt"],
+                 "sin": calc_engine.FLOAT_FUNCTIONS["sin"],
+                 "cos": calc_engine.FLOAT_FUNCTIONS["cos"],
+                 "tan": calc_engine.FLOAT_FUNCTIONS["tan"]}
+    for i in range(count):
+        eval(EXPRESSIONS[i % len(EXPRESSIONS)], namespace)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculator expression engine benchmarks")
+    parser.add_argument("--count", type=int, default=2_000_000)
+    parser.add_argument("--terms", type=int, default=300, help="terms in the backend benchmark expression")
+    args = parser.parse_args()
+
+    slow = max(args.count // 100, 1000)
+    print(f"Cached engine:   {time_loop(bench_cached, args.count):>12,.0f} evals/s")
+    print(f"Uncached engine: {time_loop(bench_uncached, slow):>12,.0f} evals/s")
+    print(f"Built-in eval:   {time_loop(bench_eval, slow):>12,.0f} evals/s")
+
+    text = long_expression(args.terms)
+    repeats = max(args.count // (args.terms * 20), 10)
+    print(f"\nBackends on a {args.terms}-term expression:")
+    for backend, precision in (("float", None), ("decimal", 28), ("decimal", 100), ("decimal", 1000), ("fraction", None)):
+        label = backend if precision is None else f"{backend} ({precision} digits)"
+        rate = bench_backend(backend, precision or calc_engine.DEFAULT_PRECISION, text, repeats)
+        print(f"{label:<24} {rate:>10,.0f} evals/s")
+
+
+if __name__ == "__main__":
+    main()
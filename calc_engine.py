@@ -0,0 +1,357 @@
+import math
+import operator
+import re
+from functools import lru_cache
+
+TOKEN = re.compile(r"""
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>\*\*|//|[-+*/%(),])
+  | (?P<space>\s+)
+  | (?P<error>.)
+""", re.VERBOSE)
+
+BINARY_OPS = {"+": "add", "-": "sub", "*": "mul", "/": "div", "//": "floordiv", "%": "mod", "**": "pow"}
+FUNCTION_NAMES = ("sqrt", "sin", "cos", "tan")
+LEFT_CHAIN = ("add", "sub", "mul", "div", "floordiv", "mod")
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+# Integer powers whose result would need more bits than this are done in
+# floats, so "9**9**9" and "(9**9999)**9999" fail fast instead of building
+# an enormous int. The decimal backend still bounds the exponent.
+MAX_INT_EXPONENT = 10_000
+MAX_INT_BITS = 100_000
+
+
+class CalcError(ValueError):
+    pass
+
+
+def tokenize(text):
+    tokens = []
+    for match in TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind == "space":
+            continue
+        if kind == "error":
+            raise CalcError(f"Unexpected character {match.group()!r}")
+        tokens.append((kind, match.group()))
+    return tokens
+
+
+# The parser builds a tree of plain tuples:
+#   ("num", text) ("var", name) ("neg", x) ("pos", x) ("call", name, x)
+#   (op, left, right) with op one of BINARY_OPS' values.
+# Number literals keep their source text so each numeric backend can read
+# them its own way.
+
+class Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, text = self.peek()
+        if kind is None or (value is not None and text != value):
+            raise CalcError(f"Expected {value or 'a value'}")
+        self.pos += 1
+        return kind, text
+
+    def parse(self):
+        if not self.tokens:
+            raise CalcError("Empty expression")
+        tree = self.expression()
+        if self.pos != len(self.tokens):
+            raise CalcError(f"Unexpected {self.peek()[1]!r}")
+        return tree
+
+    def expression(self):
+        tree = self.term()
+        while self.peek()[1] in ("+", "-"):
+            op = self.take()[1]
+            tree = (BINARY_OPS[op], tree, self.term())
+        return tree
+
+    def term(self):
+        tree = self.unary()
+        while self.peek()[1] in ("*", "/", "//", "%"):
+            op = self.take()[1]
+            tree = (BINARY_OPS[op], tree, self.unary())
+        return tree
+
+    def unary(self):
+        # Signs are gathered in a loop so "-----1" doesn't recurse per sign.
+        signs = []
+        while self.peek()[1] in ("-", "+"):
+            signs.append("neg" if self.take()[1] == "-" else "pos")
+        tree = self.power()
+        for sign in reversed(signs):
+            tree = (sign, tree)
+        return tree
+
+    def power(self):
+        tree = self.atom()
+        if self.peek()[1] == "**":
+            self.take()
+            tree = ("pow", tree, self.unary())
+        return tree
+
+    def atom(self):
+        kind, text = self.take()
+        if kind == "number":
+            return ("num", text)
+        if kind == "name":
+            if self.peek()[1] == "(":
+                if text not in FUNCTION_NAMES:
+                    raise CalcError(f"Unknown function {text!r}")
+                self.take("(")
+                argument = self.expression()
+                self.take(")")
+                return ("call", text, argument)
+            return ("var", text)
+        if text == "(":
+            tree = self.expression()
+            self.take(")")
+            return tree
+        raise CalcError(f"Unexpected {text!r}")
+
+
+def parse(text):
+    try:
+        return Parser(tokenize(text)).parse()
+    except RecursionError:
+        raise CalcError("Expression too deeply nested") from None
+
+
+def free_names(tree):
+    names = set()
+    stack = [tree]
+    while stack:
+        tree = stack.pop()
+        if tree[0] == "var":
+            if tree[1] not in CONSTANTS:
+                names.add(tree[1])
+        elif tree[0] != "num":
+            stack.extend(child for child in tree[1:] if isinstance(child, tuple))
+    return names
+
+
+def power(base, exponent):
+    if (isinstance(base, int) and isinstance(exponent, int)
+            and abs(exponent) * max(base.bit_length(), 1) > MAX_INT_BITS):
+        return float(base) ** exponent
+    return base ** exponent
+
+
+def number(text):
+    if "." in text or "e" in text or "E" in text:
+        return float(text)
+    return int(text)
+
+
+# Exact sines of the first-quadrant special angles, as
+# (numerator, denominator, radicand) meaning numerator/denominator*sqrt(radicand).
+QUADRANT_SINES = {0: (0, 1, 1), 30: (1, 2, 1), 45: (1, 2, 2), 60: (1, 2, 3), 90: (1, 1, 1)}
+
+
+def exact_angles():
+    # sin/cos/tan at every multiple of 30 and 45 degrees in [0, 360), in the
+    # same (numerator, denominator, radicand) form; tan is missing at its poles.
+    sines = {}
+    for base, (num, den, rad) in QUADRANT_SINES.items():
+        for degrees, sign in ((base, 1), (180 - base, 1), (180 + base, -1), (360 - base, -1)):
+            sines[degrees % 360] = (sign * num, den, rad)
+    table = {}
+    for degrees, sine in sines.items():
+        cosine = sines[(degrees + 90) % 360]
+        table[("sin", degrees)] = sine
+        table[("cos", degrees)] = cosine
+        if cosine[0]:
+            # (a/b)sqrt(m) / ((c/d)sqrt(n)) with m, n in {1, 2, 3} and m == n or one of them 1.
+            (a, b, m), (c, d, n) = sine, cosine
+            num, den = a * d, b * c
+            if m != n:
+                num, den, rad = num, den * n, m * n
+            else:
+                rad = 1
+            if den < 0:
+                num, den = -num, -den
+            divisor = math.gcd(num, den)
+            table[("tan", degrees)] = (num // divisor, den // divisor, rad)
+    return table
+
+
+EXACT_ANGLES = exact_angles()
+TAN_POLES = (90, 270)
+
+
+def angle_table(convert):
+    return {key: convert(*value) for key, value in EXACT_ANGLES.items()}
+
+
+def trig_function(name, table, fallback):
+    # Special angles come from the table, so sin(180) is exactly 0.
+    def function(degrees):
+        angle = degrees % 360
+        if angle < 0:
+            angle += 360
+        value = table.get((name, angle))
+        if value is not None:
+            return value
+        if name == "tan" and angle in TAN_POLES:
+            raise CalcError(f"tan({degrees}) is undefined")
+        return fallback(angle)
+    return function
+
+
+FLOAT_ANGLES = angle_table(lambda num, den, rad: num / den * math.sqrt(rad))
+
+# Trig buttons work in degrees, like Calculator.apply_function.
+FLOAT_FUNCTIONS = {
+    "number": number,
+    "constant": CONSTANTS.__getitem__,
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "div": operator.truediv,
+    "floordiv": operator.floordiv,
+    "mod": operator.mod,
+    "pow": power,
+    "neg": operator.neg,
+    "pos": operator.pos,
+    "sqrt": math.sqrt,
+    "sin": trig_function("sin", FLOAT_ANGLES, lambda x: math.sin(math.radians(x))),
+    "cos": trig_function("cos", FLOAT_ANGLES, lambda x: math.cos(math.radians(x))),
+    "tan": trig_function("tan", FLOAT_ANGLES, lambda x: math.tan(math.radians(x))),
+}
+
+BACKENDS = ("float", "decimal", "fraction")
+DEFAULT_PRECISION = 28
+
+
+@lru_cache(maxsize=None)
+def backend_functions(backend="float", precision=DEFAULT_PRECISION):
+    if backend == "float":
+        return FLOAT_FUNCTIONS
+    import calc_numeric
+    if backend == "decimal":
+        return calc_numeric.decimal_functions(precision)
+    if backend == "fraction":
+        return calc_numeric.fraction_functions()
+    raise CalcError(f"Unknown backend {backend!r}")
+
+
+def compile_tree(tree, functions=FLOAT_FUNCTIONS):
+    # Turns the tree into nested closures that each take the variable mapping.
+    kind = tree[0]
+    if kind == "num":
+        value = functions["number"](tree[1])
+        return lambda env: value
+    if kind == "var":
+        name = tree[1]
+        if name in CONSTANTS:
+            value = functions["constant"](name)
+            return lambda env: value
+        return lambda env: env[name]
+    if kind == "call":
+        function = functions[tree[1]]
+        argument = compile_tree(tree[2], functions)
+        return lambda env: function(argument(env))
+    if kind in ("neg", "pos"):
+        # A run of signs becomes one closure that applies them in a loop.
+        signs = []
+        while tree[0] in ("neg", "pos"):
+            signs.append(functions[tree[0]])
+            tree = tree[1]
+        operand = compile_tree(tree, functions)
+        if len(signs) == 1:
+            function = signs[0]
+            return lambda env: function(operand(env))
+        signs.reverse()
+
+        def signed(env):
+            value = operand(env)
+            for function in signs:
+                value = function(value)
+            return value
+        return signed
+    if kind in LEFT_CHAIN and tree[1][0] in LEFT_CHAIN:
+        # Likewise a left-leaning chain like 1+2-3*4+..., so a long sum
+        # compiles and runs without a frame per term.
+        steps = []
+        while tree[0] in LEFT_CHAIN:
+            steps.append((functions[tree[0]], compile_tree(tree[2], functions)))
+            tree = tree[1]
+        first = compile_tree(tree, functions)
+        steps.reverse()
+
+        def chain(env):
+            value = first(env)
+            for function, right in steps:
+                value = function(value, right(env))
+            return value
+        return chain
+    function = functions[kind]
+    left = compile_tree(tree[1], functions)
+    right = compile_tree(tree[2], functions)
+    return lambda env: function(left(env), right(env))
+
+
+class Expression:
+    __slots__ = ("source", "tree", "names", "function")
+
+    def __init__(self, source, tree, names, function):
+        self.source = source
+        self.tree = tree
+        self.names = names
+        self.function = function
+
+    def __call__(self, env=None):
+        if env is None and self.names:
+            raise CalcError(f"No value for {min(self.names)!r}")
+        try:
+            return self.function(env)
+        except KeyError as error:
+            raise CalcError(f"No value for {error.args[0]!r}") from None
+        except RecursionError:
+            raise CalcError("Expression too deeply nested") from None
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+
+def normalize(text):
+    # One space between tokens, so "1+2" and " 1 + 2" share a cache entry
+    # while "1 2" stays an error rather than turning into 12.
+    return " ".join(token for _, token in tokenize(text))
+
+
+@lru_cache(maxsize=4096)
+def compile_normalized(text, backend="float", precision=DEFAULT_PRECISION):
+    tree = parse(text)
+    names = frozenset(free_names(tree))
+    try:
+        function = compile_tree(tree, backend_functions(backend, precision))
+    except RecursionError:
+        raise CalcError("Expression too deeply nested") from None
+    expression = Expression(text, tree, names, function)
+    if not names:
+        # Constant expressions are folded once; later calls just return it.
+        value = expression()
+        expression.function = lambda env: value
+    return expression
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(text):
+    # Raw-text front cache so repeated calls skip normalizing as well.
+    return compile_normalized(normalize(text))
+
+
+def evaluate(text, env=None, backend="float", precision=DEFAULT_PRECISION):
+    if backend == "float":
+        return compile_expression(text)(env)
+    return compile_normalized(normalize(text), backend, precision)(env)
@@ -0,0 +1,183 @@
+import bisect
+import json
+import os
+
+import calc_engine
+
+HISTORY_FILE = 'calc_history.jsonl'
+HISTORY_LIMIT = 1000
+MEMO_LIMIT = 200_000
+
+
+class History:
+    # One JSON object per line, so saving an entry is a single append rather
+    # than rewriting the whole file. The file is compacted once it holds
+    # twice the limit.
+    def __init__(self, path=HISTORY_FILE, limit=HISTORY_LIMIT):
+        self.path = path
+        self.limit = limit
+        self.entries = []
+        self.lines = 0
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # torn last line from an interrupted write
+                    self.lines += 1
+            self.entries = self.entries[-limit:]
+
+    def add(self, expression, result):
+        entry = {"expression": expression, "result": result}
+        self.entries.append(entry)
+        self.lines += 1
+        if self.lines > 2 * self.limit:
+            self.entries = self.entries[-self.limit:]
+            with open(self.path, 'w') as f:
+                f.writelines(json.dumps(e) + "\n" for e in self.entries)
+            self.lines = len(self.entries)
+        else:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+
+def common_prefix(a, b):
+    if b.startswith(a):
+        return len(a)
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class IncrementalEvaluator:
+    # Every AST node is interned by its kind and its children's ids, so a
+    # subtree that did not change between two evaluations gets the same id
+    # and its value comes from the memo instead of being recomputed.
+    #
+    # Editing normally happens at the end of the entry, so the top-level
+    # sum is kept as a chain of partial results, one per term. Only the
+    # text after the last unchanged term is tokenized and parsed again,
+    # which keeps `=` flat as the expression grows.
+    def __init__(self, backend="float", precision=calc_engine.DEFAULT_PRECISION):
+        self.functions = calc_engine.backend_functions(backend, precision)
+        self.reset()
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        self.ids = {}
+        self.memo = {}
+        self.terms = {}  # term source -> (node id, value)
+        self.text = ""
+        self.splits = []  # offset of each top-level + or - in self.text
+        self.chain = []  # (node id, value) of the sum up to each term
+
+    def node(self, key, compute):
+        node_id = self.ids.get(key)
+        if node_id is None:
+            node_id = self.ids[key] = len(self.ids)
+        if node_id in self.memo:
+            self.hits += 1
+            return node_id, self.memo[node_id]
+        self.misses += 1
+        value = self.memo[node_id] = compute()
+        return node_id, value
+
+    def walk(self, tree):
+        # Explicit stack: a long product is a tree as deep as it is long,
+        # well past Python's recursion limit.
+        functions = self.functions
+        ids, values = [], []
+        stack = [(tree, False)]
+        while stack:
+            node, expanded = stack.pop()
+            kind = node[0]
+            if kind == "num":
+                result = self.node(("num", node[1]), lambda: functions["number"](node[1]))
+            elif kind == "var":
+                if node[1] not in calc_engine.CONSTANTS:
+                    raise calc_engine.CalcError(f"No value for {node[1]!r}")
+                result = self.node(("var", node[1]), lambda: functions["constant"](node[1]))
+            else:
+                children = node[2:] if kind == "call" else node[1:]
+                if not expanded:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in reversed(children))
+                    continue
+                count = len(children)
+                child_ids = tuple(ids[-count:])
+                child_values = values[-count:]
+                del ids[-count:], values[-count:]
+                name = node[1] if kind == "call" else kind
+                result = self.node((name, child_ids), lambda: functions[name](*child_values))
+            ids.append(result[0])
+            values.append(result[1])
+        return ids[0], values[0]
+
+    def term(self, tokens):
+        source = " ".join(text for _, text in tokens)
+        result = self.terms.get(source)
+        if result is None:
+            try:
+                tree = calc_engine.Parser(tokens).parse()
+            except RecursionError:
+                raise calc_engine.CalcError("Expression too deeply nested") from None
+            result = self.terms[source] = self.walk(tree)
+        return result
+
+    def extend(self, chain, op, tokens):
+        term_id, term_value = self.term(tokens)
+        if not chain:
+            return term_id, term_value
+        left_id, left_value = chain[-1]
+        name = calc_engine.BINARY_OPS[op]
+        return self.node((name, (left_id, term_id)), lambda: self.functions[name](left_value, term_value))
+
+    def evaluate(self, text):
+        if len(self.memo) > MEMO_LIMIT:
+            self.reset()
+        # A term is reused when the operator after it and the character
+        # after that are unchanged ("1e-" followed by a digit is one number).
+        keep = bisect.bisect_left(self.splits, common_prefix(self.text, text) - 1)
+        splits, chain = self.splits[:keep], self.chain[:keep]
+        offset = splits[-1] + 1 if keep else 0
+        op = text[splits[-1]] if keep else None
+
+        tokens = []
+        depth = 0
+        operand = False
+        for match in calc_engine.TOKEN.finditer(text, offset):
+            kind, value = match.lastgroup, match.group()
+            if kind == "space":
+                continue
+            if kind == "error":
+                raise calc_engine.CalcError(f"Unexpected character {value!r}")
+            if depth == 0 and operand and value in ("+", "-"):
+                chain.append(self.extend(chain, op, tokens))
+                splits.append(match.start())
+                op, tokens, operand = value, [], False
+                continue
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+            operand = kind in ("number", "name") or value == ")"
+            tokens.append((kind, value))
+        if not tokens and not chain:
+            raise calc_engine.CalcError("Empty expression")
+        chain.append(self.extend(chain, op, tokens))
+
+        self.text, self.splits, self.chain = text, splits, chain
+        return chain[-1][1]
@@ -0,0 +1,139 @@
+import math
+import operator
+from decimal import ROUND_FLOOR, Context, Decimal, localcontext
+from fractions import Fraction
+
+from calc_engine import CONSTANTS, MAX_INT_BITS, MAX_INT_EXPONENT, CalcError, angle_table, trig_function
+
+# Function tables for calc_engine.backend_functions. Number literals are read
+# straight from their source text, so 0.1 is exactly a tenth in both.
+
+
+def decimal_pi(context):
+    # Series from the decimal module documentation.
+    with localcontext(context) as ctx:
+        ctx.prec += 2
+        lasts, t, s, n, na, d, da = 0, Decimal(3), 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+    return context.plus(s)
+
+
+def decimal_series(x, context, cosine):
+    with localcontext(context) as ctx:
+        ctx.prec += 2
+        i, lasts, s, fact, num, sign = (0, 0, 1, 1, 1, 1) if cosine else (1, 0, x, 1, x, 1)
+        while s != lasts:
+            lasts = s
+            i += 2
+            fact *= i * (i - 1)
+            num *= x * x
+            sign *= -1
+            s += num / fact * sign
+    return context.plus(s)
+
+
+def decimal_functions(precision):
+    context = Context(prec=precision)
+    pi = decimal_pi(context)
+    constants = {"pi": pi, "e": context.exp(Decimal(1))}
+
+    def radians(degrees):
+        degrees = context.remainder(degrees, Decimal(360))
+        return context.divide(context.multiply(degrees, pi), Decimal(180))
+
+    def floordiv(a, b):
+        return context.divide(a, b).to_integral_value(rounding=ROUND_FLOOR, context=context)
+
+    def mod(a, b):
+        # Sign follows the divisor, like Python's % on floats.
+        return context.subtract(a, context.multiply(b, floordiv(a, b)))
+
+    def power(base, exponent):
+        if exponent == exponent.to_integral_value() and abs(exponent) > MAX_INT_EXPONENT:
+            raise CalcError("Exponent too large")
+        return context.power(base, exponent)
+
+    def sin(x):
+        return decimal_series(radians(x), context, cosine=False)
+
+    def cos(x):
+        return decimal_series(radians(x), context, cosine=True)
+
+    def tan(x):
+        return context.divide(sin(x), cos(x))
+
+    angles = angle_table(lambda num, den, rad: context.multiply(
+        context.divide(Decimal(num), Decimal(den)), context.sqrt(Decimal(rad))))
+    return {
+        "number": context.create_decimal,
+        "constant": constants.__getitem__,
+        "add": context.add,
+        "sub": context.subtract,
+        "mul": context.multiply,
+        "div": context.divide,
+        "floordiv": floordiv,
+        "mod": mod,
+        "pow": power,
+        "neg": context.minus,
+        "pos": context.plus,
+        "sqrt": context.sqrt,
+        "sin": trig_function("sin", angles, sin),
+        "cos": trig_function("cos", angles, cos),
+        "tan": trig_function("tan", angles, tan),
+    }
+
+
+def fraction_sqrt(x):
+    if x < 0:
+        raise CalcError("math domain error")
+    num, den = math.isqrt(x.numerator), math.isqrt(x.denominator)
+    if num * num == x.numerator and den * den == x.denominator:
+        return Fraction(num, den)
+    return Fraction(math.sqrt(x))
+
+
+def fraction_power(base, exponent):
+    if exponent.denominator == 1:
+        bits = max(base.numerator.bit_length(), base.denominator.bit_length(), 1)
+        if abs(exponent) * bits > MAX_INT_BITS:
+            raise CalcError("Result too large")
+        return base ** exponent.numerator
+    if exponent == Fraction(1, 2):
+        return fraction_sqrt(base)
+    value = float(base) ** float(exponent)
+    if isinstance(value, complex):
+        raise CalcError("math domain error")
+    return Fraction(value)
+
+
+def inexact(function):
+    # Irrational results have no exact form; they are rounded through float.
+    return lambda x: Fraction(function(math.radians(x)))
+
+
+def fraction_functions():
+    # Exact wherever the answer is rational; irrational results (sqrt(2),
+    # sin(1), pi) are the nearest float, as a fraction.
+    angles = angle_table(lambda num, den, rad: Fraction(num, den) * fraction_sqrt(Fraction(rad)))
+    return {
+        "number": Fraction,
+        "constant": lambda name: Fraction(CONSTANTS[name]),
+        "add": operator.add,
+        "sub": operator.sub,
+        "mul": operator.mul,
+        "div": operator.truediv,
+        "floordiv": lambda a, b: Fraction(a // b),
+        "mod": operator.mod,
+        "pow": fraction_power,
+        "neg": operator.neg,
+        "pos": operator.pos,
+        "sqrt": fraction_sqrt,
+        "sin": trig_function("sin", angles, inexact(math.sin)),
+        "cos": trig_function("cos", angles, inexact(math.cos)),
+        "tan": trig_function("tan", angles, inexact(math.tan)),
+    }
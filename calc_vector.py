@@ -0,0 +1,111 @@
+import argparse
+import csv
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+import calc_engine
+
+CSV_CHUNK = 65_536
+
+
+def radians_function(function):
+    return lambda x: function(np.radians(x))
+
+
+# Same language as the calculator, applied element-wise. Bad rows give
+# inf/nan instead of stopping the whole column.
+NUMPY_FUNCTIONS = {
+    "number": float,
+    "constant": calc_engine.CONSTANTS.__getitem__,
+    "add": np.add,
+    "sub": np.subtract,
+    "mul": np.multiply,
+    "div": np.true_divide,
+    "floordiv": np.floor_divide,
+    "mod": np.mod,
+    "pow": np.power,
+    "neg": np.negative,
+    "pos": np.positive,
+    "sqrt": np.sqrt,
+    "sin": radians_function(np.sin),
+    "cos": radians_function(np.cos),
+    "tan": radians_function(np.tan),
+}
+
+
+@lru_cache(maxsize=1024)
+def compile_vectorized(text):
+    source = calc_engine.normalize(text)
+    tree = calc_engine.parse(source)
+    names = frozenset(calc_engine.free_names(tree))
+    return calc_engine.Expression(source, tree, names, calc_engine.compile_tree(tree, NUMPY_FUNCTIONS))
+
+
+def evaluate_arrays(text, columns, length=None):
+    expression = compile_vectorized(text)
+    env = {}
+    for name in expression.names:
+        if name not in columns:
+            raise calc_engine.CalcError(f"No column named {name!r}")
+        env[name] = np.asarray(columns[name], dtype=np.float64)
+    if length is None:
+        length = max((len(values) for values in env.values()), default=1)
+    with np.errstate(all="ignore"):
+        result = expression(env)
+    return np.broadcast_to(np.asarray(result, dtype=np.float64), (length,))
+
+
+def cell_value(row, index):
+    try:
+        return float(row[index])
+    except (ValueError, IndexError):
+        return np.nan
+
+
+def column_values(rows, index):
+    # Clean columns convert in one go; empty or non-numeric cells and short
+    # rows drop to the per-cell path and read as nan.
+    try:
+        return np.array([row[index] for row in rows], dtype=np.float64)
+    except (ValueError, IndexError):
+        return np.array([cell_value(row, index) for row in rows], dtype=np.float64)
+
+
+def evaluate_csv(source, text, chunk_size=CSV_CHUNK):
+    # Yields (rows, results) per chunk; each chunk is one vectorized pass.
+    expression = compile_vectorized(text)
+    reader = csv.reader(source)
+    header = next(reader)
+    missing = expression.names - set(header)
+    if missing:
+        raise calc_engine.CalcError(f"No column named {min(missing)!r}")
+    wanted = [(name, header.index(name)) for name in sorted(expression.names)]
+
+    while True:
+        rows = [row for _, row in zip(range(chunk_size), reader)]
+        if not rows:
+            return
+        columns = {name: column_values(rows, index) for name, index in wanted}
+        yield rows, evaluate_arrays(text, columns, len(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a calculator expression over CSV columns")
+    parser.add_argument("expression")
+    parser.add_argument("csv", nargs="?", default="-", help="input CSV with a header row (default stdin)")
+    parser.add_argument("--chunk-size", type=int, default=CSV_CHUNK)
+    args = parser.parse_args()
+
+    source = sys.stdin if args.csv == "-" else open(args.csv, newline="")
+    try:
+        for _, results in evaluate_csv(source, args.expression, args.chunk_size):
+            sys.stdout.write("\n".join(map(repr, results.tolist())) + "\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == "__main__":
+    main()
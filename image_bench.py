@@ -0,0 +1,247 @@
+from PIL import Image, ImageEnhance, ImageFilter
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+
+import numpy as np
+
+from image_enhancer import decode, parse_size
+from image_ops import default_pipeline
+
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'BMP': 'bmp', 'TIFF': 'tif'}
+REGRESSION = 0.10
+NOISE_MS = 0.5  # stage times closer than this are never called regressions
+
+
+def synthetic_image(width, height, rng):
+    # Smooth gradients plus noise, so JPEG has something like photo content.
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=-1)
+    noise = rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+
+def encode(img, fmt='JPEG'):
+    out = io.BytesIO()
+    img.save(out, fmt)
+    return out.getvalue()
+
+
+def full_size(data, pipeline, size):
+    # The path without --size: decode everything, process, then shrink.
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    edit = pipeline.run(img)
+    edit.thumbnail(size)
+    return edit
+
+
+def reduced(data, pipeline, size):
+    return pipeline.run(decode(data, pipeline, size))
+
+
+def time_path(function, corpus, pipeline, size, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for data in corpus:
+            function(data, pipeline, size)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus)
+
+
+def compare_draft(width, height, size, count=8, repeats=3, seed=0):
+    rng = np.random.default_rng(seed)
+    corpus = [encode(synthetic_image(width, height, rng)) for _ in range(count)]
+    pipeline = default_pipeline()
+    full = time_path(full_size, corpus, pipeline, size, repeats)
+    draft = time_path(reduced, corpus, pipeline, size, repeats)
+    return full, draft
+
+
+def make_corpus(width, height, fmt, count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [encode(synthetic_image(width, height, rng), fmt) for _ in range(count)]
+
+
+def write_corpus(directory, corpus, fmt):
+    os.makedirs(directory, exist_ok=True)
+    for number, data in enumerate(corpus):
+        with open(os.path.join(directory, f'synthetic{number:05d}.{FORMATS[fmt]}'), 'wb') as f:
+            f.write(data)
+
+
+def stage_times(data, factor=1.5):
+    # The original chain, one stage at a time.
+    times = {}
+    start = time.perf_counter()
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    times['decode'], start = time.perf_counter() - start, time.perf_counter()
+    img = img.filter(ImageFilter.SHARPEN)
+    times['sharpen'], start = time.perf_counter() - start, time.perf_counter()
+    img = img.convert('L')
+    times['convert'], start = time.perf_counter() - start, time.perf_counter()
+    img = img.rotate(-90)
+    times['rotate'], start = time.perf_counter() - start, time.perf_counter()
+    img = ImageEnhance.Contrast(img).enhance(factor)
+    times['contrast'], start = time.perf_counter() - start, time.perf_counter()
+    encode(img)
+    times['encode'] = time.perf_counter() - start
+    return times
+
+
+def pipeline_times(data, pipeline):
+    times = {}
+    start = time.perf_counter()
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    times['decode'] = time.perf_counter() - start
+    img = pipeline.run(img, times)
+    start = time.perf_counter()
+    encode(img)
+    times['encode'] = time.perf_counter() - start
+    return times
+
+
+def summarize(samples):
+    summary = {}
+    for stage in samples[0]:
+        values = np.array([sample[stage] for sample in samples]) * 1000
+        summary[stage] = {'median_ms': float(np.median(values)), 'p95_ms': float(np.percentile(values, 95))}
+    totals = np.array([sum(sample.values()) for sample in samples]) * 1000
+    summary['total'] = {'median_ms': float(np.median(totals)), 'p95_ms': float(np.percentile(totals, 95))}
+    return summary
+
+
+def run_case(width, height, fmt, count, repeats, seed):
+    # Runs in its own process so ru_maxrss is this case's peak alone.
+    corpus = make_corpus(width, height, fmt, count, seed)
+    pipeline = default_pipeline()
+    stages, fused = [], []
+    for _ in range(repeats):
+        for data in corpus:
+            stages.append(stage_times(data))
+            fused.append(pipeline_times(data, pipeline))
+    return {
+        'width': width,
+        'height': height,
+        'format': fmt,
+        'count': count,
+        'bytes_per_image': sum(map(len, corpus)) // count,
+        'stages': summarize(stages),
+        'pipeline': summarize(fused),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_suite(sizes, formats, count, repeats=3, seed=0):
+    cases = []
+    context = multiprocessing.get_context('spawn')
+    for width, height in sizes:
+        for fmt in formats:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                cases.append(pool.submit(run_case, width, height, fmt, count, repeats, seed).result())
+    return {
+        'python': platform.python_version(),
+        'pillow': Image.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'cases': cases,
+    }
+
+
+def case_key(case):
+    return f"{case['width']}x{case['height']} {case['format']}"
+
+
+def print_suite(results):
+    for case in results['cases']:
+        print(f"{case_key(case)} ({case['count']} images, {case['bytes_per_image'] / 1024:.0f} KiB each, "
+              f"peak RSS {case['peak_rss_mb']:.0f} MB)")
+        for name in ('stages', 'pipeline'):
+            row = " ".join(f"{stage}={times['median_ms']:.1f}" for stage, times in case[name].items())
+            print(f"  {name:<8} {row}  (median ms)")
+
+
+def compare(results, baseline, threshold=REGRESSION):
+    # Median stage times and peak RSS against an earlier run; returns the
+    # number of regressions beyond the threshold.
+    previous = {case_key(case): case for case in baseline['cases']}
+    regressions = 0
+    for case in results['cases']:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        checks = [(f"{name} {stage}", old[name][stage]['median_ms'], case[name][stage]['median_ms'], NOISE_MS)
+                  for name in ('stages', 'pipeline') for stage in case[name] if stage in old[name]]
+        checks.append(('peak RSS', old['peak_rss_mb'], case['peak_rss_mb'], 0.0))
+        for label, before, after, noise in checks:
+            change = after / before - 1 if before else 0.0
+            if change > threshold and after - before > noise:
+                regressions += 1
+                print(f"REGRESSION {case_key(case)} {label}: {before:.2f} -> {after:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image enhancer benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    suite = commands.add_parser('suite', help="per-stage latency and peak RSS over synthetic corpora")
+    suite.add_argument('--sizes', default='640x480,1920x1080,4000x3000',
+                       type=lambda text: [parse_size(part) for part in text.split(',')])
+    suite.add_argument('--formats', default='JPEG,PNG', type=lambda text: text.upper().split(','))
+    suite.add_argument('--count', type=int, default=10, help="images per corpus")
+    suite.add_argument('--repeats', type=int, default=3)
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--json', default=None, help="write the results here")
+    suite.add_argument('--compare', default=None, help="earlier --json results to compare against")
+    suite.add_argument('--threshold', type=float, default=REGRESSION)
+    suite.add_argument('--write-corpus', default=None,
+                       help="also save each corpus under this directory, for timing image_enhancer.py itself")
+
+    draft = commands.add_parser('draft', help="draft decoding against the full-size path")
+    draft.add_argument('--source', type=parse_size, default=(4000, 3000), help="synthetic JPEG size")
+    draft.add_argument('--size', type=parse_size, default=(320, 240), help="output size target")
+    draft.add_argument('--count', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == 'draft':
+        full, reduced_time = compare_draft(*args.source, args.size, args.count)
+        print(f"{args.source[0]}x{args.source[1]} JPEG -> {args.size[0]}x{args.size[1]}")
+        print(f"  full-size decode + process: {full * 1000:8.1f} ms/image")
+        print(f"  draft decode + process:     {reduced_time * 1000:8.1f} ms/image "
+              f"({full / reduced_time:.1f}x faster)")
+        return
+
+    unknown = set(args.formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(sorted(unknown))}")
+    if args.write_corpus:
+        for width, height in args.sizes:
+            for fmt in args.formats:
+                write_corpus(os.path.join(args.write_corpus, f'{width}x{height}-{fmt.lower()}'),
+                             make_corpus(width, height, fmt, args.count, args.seed), fmt)
+    results = run_suite(args.sizes, args.formats, args.count, args.repeats, args.seed)
+    print_suite(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"{regressions} regression(s) over {args.threshold:.0%}")
+        raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.enhancer_manifest.json'
+SAVE_EVERY = 1000
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def pipeline_key(pipeline, size=None):
+    # Anything that changes the output bytes belongs in here.
+    return content_hash(f"{pipeline.to_json()}|JPEG|{size}".encode())
+
+
+class Manifest:
+    # Remembers, per input file name, the size and mtime it had, its content
+    # hash and the pipeline it was processed with. A file whose size and
+    # mtime still match is skipped on the stat alone; one whose stat changed
+    # but whose bytes hash the same is only re-stamped.
+    def __init__(self, pathOut, key, force=False):
+        self.path = os.path.join(pathOut, MANIFEST_NAME)
+        self.key = key
+        self.force = force  # reprocess everything, but still record it
+        self.entries = {}
+        self.seen = set()
+        self.unsaved = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                self.entries = {}  # damaged manifest: everything is redone
+        with os.scandir(pathOut) as entries:
+            self.outputs = {entry.name for entry in entries}
+
+    def unchanged(self, name, stat, output_name):
+        self.seen.add(name)
+        entry = self.entries.get(name)
+        return (not self.force and entry is not None
+                and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns
+                and entry[3] == self.key and output_name in self.outputs)
+
+    def same_content(self, name, stat, digest, output_name):
+        entry = self.entries.get(name)
+        if (self.force or entry is None or entry[2] != digest
+                or entry[3] != self.key or output_name not in self.outputs):
+            return False
+        self.entries[name] = [stat.st_size, stat.st_mtime_ns, digest, self.key]
+        return True
+
+    def record(self, name, size, mtime_ns, digest):
+        self.entries[name] = [size, mtime_ns, digest, self.key]
+        self.unsaved += 1
+        if self.unsaved >= SAVE_EVERY:
+            self.save()
+
+    def save(self, prune=False):
+        if prune:
+            # Inputs that were not in the folder this run are forgotten.
+            self.entries = {name: entry for name, entry in self.entries.items() if name in self.seen}
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.entries, f, separators=(',', ':'))
+        os.replace(temp, self.path)
+        self.unsaved = 0
@@ -1,18 +1,235 @@
-from Pil import Image, ImageEnhance, ImageFilter
+from PIL import Image
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import argparse
+import io
 import os
+import queue
+import threading
+import time
 
-path = ',/imgs'
-pathOut = '/editedImgs'
+from image_cache import Manifest, content_hash, pipeline_key
+from image_ops import Pipeline, default_pipeline
+from image_tiles import TILE_PIXELS, enhance_tiled
 
-for filename in os.listdir(path):
-    img = Image.open(f"{path}/{filename}")
+path = './imgs'
+pathOut = './editedImgs'
+factor = 1.5
 
-    edit = img.filter(ImageFilter.SHARPEN).convert('L').rotate(-90)
+DONE = None
 
-    factor = 1.5
-    enhancer = ImageEnhance.Contrast(edit)
-    edit = enhancer.enhance(factor)
 
+def decode(data, pipeline, size=None):
+    img = Image.open(io.BytesIO(data))
+    if size:
+        # Let libjpeg scale down (by up to 8x) and, when the pipeline starts
+        # with grayscale anyway, hand back 'L' directly. Other formats ignore
+        # draft(); thumbnail() then brings either down to the target box.
+        img.draft('L' if pipeline.starts_with_grayscale() else img.mode, size)
+        img.thumbnail(size)
+    img.load()
+    return img
+
+
+def edit_image(data, pipeline, size=None):
+    # Runs in a worker process: bytes in, JPEG bytes out, plus stage timings.
+    # The pipeline's steps are timed under their (possibly fused) names.
+    timings = {}
+    start = time.perf_counter()
+    img = decode(data, pipeline, size)
+    timings['decode'] = time.perf_counter() - start
+
+    edit = pipeline.run(img, timings)
+
+    start = time.perf_counter()
+    out = io.BytesIO()
+    edit.save(out, 'JPEG')
+    timings['encode'] = time.perf_counter() - start
+    return out.getvalue(), timings
+
+
+def output_path(pathOut, filename):
     clean_name = os.path.splitext(filename)[0]
+    return f'{pathOut}/{clean_name}_edited.jpg'
+
+
+def read_files(path, inbox, timings, manifest, stats):
+    # Producer thread: disk reads overlap with the workers' decoding. Files
+    # the manifest already covers are skipped on their stat, or after hashing
+    # when only the stat changed.
+    try:
+        for entry in os.scandir(path):
+            if not entry.is_file():
+                continue
+            output_name = os.path.basename(output_path('', entry.name))
+            stat = entry.stat()
+            if manifest.unchanged(entry.name, stat, output_name):
+                stats['skipped'] += 1
+                continue
+            start = time.perf_counter()
+            with open(entry.path, 'rb') as f:
+                data = f.read()
+            timings['read'] += time.perf_counter() - start
+            digest = content_hash(data)
+            if manifest.same_content(entry.name, stat, digest, output_name):
+                stats['skipped'] += 1
+                continue
+            inbox.put((entry.name, data, (stat.st_size, stat.st_mtime_ns, digest)))
+    finally:
+        inbox.put(DONE)
+
+
+def write_files(pathOut, outbox, timings, manifest):
+    elapsed = 0.0
+    while True:
+        item = outbox.get()
+        if item is DONE:
+            timings['write'] = elapsed
+            return
+        filename, data, info = item
+        start = time.perf_counter()
+        with open(output_path(pathOut, filename), 'wb') as f:
+            f.write(data)
+        elapsed += time.perf_counter() - start
+        manifest.record(filename, *info)
+
+
+def run(path=path, pathOut=pathOut, pipeline=None, workers=None, queue_size=64, force=False, size=None):
+    if pipeline is None:
+        pipeline = default_pipeline(factor)
+    os.makedirs(pathOut, exist_ok=True)
+    manifest = Manifest(pathOut, pipeline_key(pipeline, size), force)
+    timings = {'read': 0.0, 'decode': 0.0}
+    stats = {'images': 0, 'failed': 0, 'skipped': 0}
+    inbox = queue.Queue(maxsize=queue_size)
+    outbox = queue.Queue(maxsize=queue_size)
+    reader = threading.Thread(target=read_files, args=(path, inbox, timings, manifest, stats), daemon=True)
+    writer = threading.Thread(target=write_files, args=(pathOut, outbox, timings, manifest), daemon=True)
+
+    def finish(filename, info, result):
+        data, stage_timings = result
+        for stage, seconds in stage_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        stats['images'] += 1
+        outbox.put((filename, data, info))
+
+    start = time.perf_counter()
+    reader.start()
+    writer.start()
+    if workers == 0:
+        # Everything in this process; handy for profiling.
+        while (item := inbox.get()) is not DONE:
+            filename, data, info = item
+            try:
+                finish(filename, info, edit_image(data, pipeline, size))
+            except Exception as error:
+                stats['failed'] += 1
+                print(f"Skipping {filename}: {error}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # At most queue_size images are in flight, so memory stays bounded
+            # however large the folder is.
+            pending = {}
+            reading = True
+            while reading or pending:
+                while reading and len(pending) < queue_size:
+                    item = inbox.get()
+                    if item is DONE:
+                        reading = False
+                        break
+                    filename, data, info = item
+                    pending[pool.submit(edit_image, data, pipeline, size)] = filename, info
+                if not pending:
+                    continue
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    filename, info = pending.pop(future)
+                    try:
+                        finish(filename, info, future.result())
+                    except Exception as error:
+                        stats['failed'] += 1
+                        print(f"Skipping {filename}: {error}")
+    outbox.put(DONE)
+    writer.join()
+    manifest.save(prune=True)
+    stats['elapsed'] = time.perf_counter() - start
+    stats['timings'] = timings
+    return stats
+
+
+def run_tiled(path=path, pathOut=pathOut, pipeline=None, tile_pixels=TILE_PIXELS):
+    # One image at a time, each in bounded memory; outputs are PGM.
+    if pipeline is None:
+        pipeline = default_pipeline(factor)
+    os.makedirs(pathOut, exist_ok=True)
+    stats = {'images': 0, 'failed': 0, 'skipped': 0, 'timings': {'tiled': 0.0}}
+    start = time.perf_counter()
+    for entry in os.scandir(path):
+        if not entry.is_file():
+            continue
+        clean_name = os.path.splitext(entry.name)[0]
+        began = time.perf_counter()
+        try:
+            enhance_tiled(entry.path, f'{pathOut}/{clean_name}_edited.pgm', pipeline, tile_pixels)
+        except (OSError, Image.DecompressionBombError) as error:
+            stats['failed'] += 1
+            print(f"Skipping {entry.name}: {error}")
+            continue
+        stats['timings']['tiled'] += time.perf_counter() - began
+        stats['images'] += 1
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
+
+def print_report(stats):
+    elapsed = stats['elapsed']
+    print(f"{stats['images']} images in {elapsed:.2f}s "
+          f"({stats['images'] / elapsed if elapsed else 0:.1f} images/sec), "
+          f"{stats['skipped']} unchanged, {stats['failed']} failed")
+    # Worker stages are summed over all workers, so with several workers
+    # their total can exceed the wall-clock time.
+    for stage, seconds in stats['timings'].items():
+        per_image = seconds / stats['images'] * 1000 if stats['images'] else 0
+        print(f"  {stage:<15} {seconds:8.2f}s total {per_image:8.2f} ms/image")
+
+
+def parse_size(text):
+    try:
+        width, height = (int(part) for part in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("size must look like 640x480")
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharpen, grayscale, rotate and boost the contrast of a folder of images")
+    parser.add_argument('--input', default=path)
+    parser.add_argument('--output', default=pathOut)
+    parser.add_argument('--factor', type=float, default=factor, help="contrast factor")
+    parser.add_argument('--pipeline', default=None, help="JSON pipeline spec (replaces the default chain)")
+    parser.add_argument('--exact', action='store_true',
+                        help="run the steps in the written order instead of grayscale first")
+    parser.add_argument('--force', action='store_true', help="reprocess every image, ignoring the manifest")
+    parser.add_argument('--size', type=parse_size, default=None,
+                        help="fit outputs in WIDTHxHEIGHT, decoding JPEGs at reduced size")
+    parser.add_argument('--tiled', action='store_true',
+                        help="process very large images in bands of bounded memory, writing PGM")
+    parser.add_argument('--tile-pixels', type=int, default=TILE_PIXELS, help="pixels per band in --tiled mode")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core, 0 runs inline)")
+    parser.add_argument('--queue-size', type=int, default=64, help="images read ahead / in flight")
+    args = parser.parse_args()
+
+    if args.pipeline:
+        pipeline = Pipeline.load(args.pipeline)
+        if args.exact:
+            pipeline.reorder = False
+    else:
+        pipeline = default_pipeline(args.factor, reorder=not args.exact)
+    if args.tiled:
+        stats = run_tiled(args.input, args.output, pipeline, args.tile_pixels)
+    else:
+        stats = run(args.input, args.output, pipeline, args.workers, args.queue_size, args.force, args.size)
+    print_report(stats)
+
 
-    edit.save(f'.{pathOut}/{clean_name}_edited.jpg')
+if __name__ == '__main__':
+    main()
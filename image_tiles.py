@@ -0,0 +1,214 @@
+from PIL import Image
+import argparse
+import bisect
+import resource
+import time
+
+import numpy as np
+
+from image_ops import Pipeline, contrast_lut, default_pipeline, fuse, histogram_mean, reorder, rotation_coords
+
+# Tiled mode for images too large to hold in memory several times over.
+# The output is produced in bands of rows and written straight to a binary
+# PGM, so peak memory follows the band size rather than the image size.
+# Uncompressed inputs (PPM/PGM, BMP, uncompressed TIFF) are read a
+# rectangle at a time from the file; anything else has to be decoded whole
+# by PIL first, which only bounds the later stages.
+TILE_PIXELS = 1 << 20
+RAW_MODES = {'L': 1, 'RGB': 3, 'BGR': 3}
+
+
+class RawSource:
+    def __init__(self, path, img):
+        self.width, self.height = img.size
+        self.strips = []
+        for tile in img.tile:
+            args = tile.args if isinstance(tile.args, tuple) else (tile.args, 0, 1)
+            rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+            bands = RAW_MODES[rawmode]
+            x0, y0, x1, y1 = tile.extents
+            self.strips.append((y0, y1, tile.offset, stride or self.width * bands, orientation))
+        self.rawmode = rawmode
+        self.bands = bands
+        self.starts = [strip[0] for strip in self.strips]
+        self.file = open(path, 'rb')
+
+    @staticmethod
+    def supports(img):
+        # One mode, full-width strips, stored row by row.
+        modes = set()
+        for tile in img.tile:
+            args = tile.args if isinstance(tile.args, tuple) else (tile.args,)
+            if tile.codec_name != 'raw' or args[0] not in RAW_MODES:
+                return False
+            if tile.extents[0] != 0 or tile.extents[2] != img.size[0]:
+                return False
+            if len(args) > 2 and args[2] not in (1, -1):
+                return False
+            modes.add(args[0])
+        return len(modes) == 1
+
+    def read(self, x0, y0, x1, y1):
+        out = np.empty((y1 - y0, (x1 - x0) * self.bands), dtype=np.uint8)
+        for i, y in enumerate(range(y0, y1)):
+            top, bottom, offset, stride, orientation = self.strips[bisect.bisect_right(self.starts, y) - 1]
+            row = y - top if orientation == 1 else bottom - 1 - y
+            self.file.seek(offset + row * stride + x0 * self.bands)
+            self.file.readinto(memoryview(out[i]))
+        if self.bands == 1:
+            return out
+        out = out.reshape(y1 - y0, x1 - x0, self.bands)
+        return out[..., ::-1] if self.rawmode == 'BGR' else out
+
+    def close(self):
+        self.file.close()
+
+
+class ArraySource:
+    def __init__(self, img):
+        if img.mode not in ('L', 'RGB'):
+            img = img.convert('RGB')
+        self.pixels = np.asarray(img)
+        self.height, self.width = self.pixels.shape[:2]
+        self.bands = 1 if img.mode == 'L' else 3
+
+    def read(self, x0, y0, x1, y1):
+        return self.pixels[y0:y1, x0:x1]
+
+    def close(self):
+        pass
+
+
+def open_source(path):
+    # PIL's decompression-bomb check is about decoding the whole image, which
+    # a RawSource never does, so the header is read with it switched off.
+    # Anything that has to be decoded is opened again under the usual limit.
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        img = Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+    with img:
+        if RawSource.supports(img):
+            return RawSource(path, img)
+    return ArraySource(Image.open(path))
+
+
+def grayscale(pixels):
+    # Same fixed-point luma as PIL's RGB -> L conversion.
+    if pixels.ndim == 2:
+        return pixels
+    r, g, b = (pixels[..., i].astype(np.uint32) for i in range(3))
+    return ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+
+def sharpen(pixels):
+    # ImageFilter.SHARPEN: 2 * centre - neighbours / 8, rounded, with the
+    # outermost ring copied unchanged. The sums are exact in float32.
+    height, width = pixels.shape[:2]
+    out = pixels.copy()
+    if height < 3 or width < 3:
+        return out
+    source = pixels.astype(np.float32)
+    # 17/8 c - (all nine) / 8 == 2c - (the eight neighbours) / 8
+    total = source[1:-1, 1:-1] * np.float32(2.125)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            total -= source[dy:height - 2 + dy, dx:width - 2 + dx] * np.float32(0.125)
+    out[1:-1, 1:-1] = np.clip(np.floor(total + np.float32(0.5)), 0, 255)
+    return out
+
+
+def tile_plan(pipeline):
+    steps = fuse(reorder(pipeline.steps) if pipeline.reorder else pipeline.steps)
+    before, angle, factor = [], 0, None
+    for step in steps:
+        op = step['op']
+        if op in ('grayscale', 'sharpen') and not angle and factor is None:
+            before.append(op)
+        elif op in ('rotate', 'rotate+contrast') and not angle and factor is None and step['angle'] % 90 == 0:
+            angle = step['angle']
+            factor = step.get('factor')
+        elif op == 'contrast' and factor is None:
+            factor = step['factor']
+        else:
+            raise ValueError(f"Tiled mode cannot run {op} at this point in the pipeline")
+    return before, angle, factor
+
+
+def read_region(source, before, x0, y0, x1, y1):
+    # Source pixels x0..x1, y0..y1 after the steps before the rotation. With
+    # sharpening, one extra pixel is read on each side (where the image has
+    # one) so tile edges come out as if the whole image had been filtered.
+    halo = 1 if 'sharpen' in before else 0
+    hx0, hy0 = max(x0 - halo, 0), max(y0 - halo, 0)
+    hx1, hy1 = min(x1 + halo, source.width), min(y1 + halo, source.height)
+    pixels = source.read(hx0, hy0, hx1, hy1)
+    for op in before:
+        pixels = grayscale(pixels) if op == 'grayscale' else sharpen(pixels)
+    pixels = grayscale(pixels)
+    return pixels[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+
+
+def bands(source, before, angle, band_rows):
+    width, height = source.width, source.height
+    for top in range(0, height, band_rows):
+        bottom = min(top + band_rows, height)
+        xin, yin, inside = rotation_coords(width, height, angle, top, bottom)
+        if not inside.any():
+            yield np.zeros((bottom - top, width), dtype=np.uint8)
+            continue
+        x0, x1 = xin[inside].min(), xin[inside].max() + 1
+        y0, y1 = yin[inside].min(), yin[inside].max() + 1
+        region = read_region(source, before, x0, y0, x1, y1)
+        flat = np.append(region.ravel(), np.uint8(0))
+        index = np.where(inside, (yin - y0) * (x1 - x0) + (xin - x0), flat.size - 1)
+        yield flat[index]
+
+
+def enhance_tiled(path, path_out, pipeline, tile_pixels=TILE_PIXELS):
+    before, angle, factor = tile_plan(pipeline)
+    source = open_source(path)
+    try:
+        width, height = source.width, source.height
+        band_rows = max(1, tile_pixels // width)
+        lut = None
+        if factor is not None:
+            # Contrast needs the mean of the finished image: one pass to
+            # count it, a second to write.
+            histogram = np.zeros(256, dtype=np.int64)
+            for band in bands(source, before, angle, band_rows):
+                histogram += np.bincount(band.ravel(), minlength=256)
+            lut = contrast_lut(histogram_mean(histogram), factor)
+        with open(path_out, 'wb') as f:
+            f.write(f"P5\n{width} {height}\n255\n".encode())
+            for band in bands(source, before, angle, band_rows):
+                f.write((lut[band] if lut is not None else band).tobytes())
+    finally:
+        source.close()
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enhance one very large image in bounded memory")
+    parser.add_argument('input')
+    parser.add_argument('output', help="binary PGM to write")
+    parser.add_argument('--factor', type=float, default=1.5)
+    parser.add_argument('--pipeline', default=None)
+    parser.add_argument('--exact', action='store_true')
+    parser.add_argument('--tile-pixels', type=int, default=TILE_PIXELS)
+    args = parser.parse_args()
+
+    pipeline = Pipeline.load(args.pipeline) if args.pipeline else default_pipeline(args.factor)
+    if args.exact:
+        pipeline.reorder = False
+    start = time.perf_counter()
+    width, height = enhance_tiled(args.input, args.output, pipeline, args.tile_pixels)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{width}x{height} in {elapsed:.2f}s ({width * height / elapsed / 1e6:.1f} Mpx/s), peak RSS {peak:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import itertools
+import json
+
+import numpy as np
+
+
+# A payline lists the row it passes through on each column, left to right,
+# e.g. [0, 1, 2, 1, 0] is a V on a 5x3 machine. A payline file is JSON:
+# {"rows": 3, "cols": 5, "paylines": [[1, 1, 1, 1, 1], [0, 1, 2, 1, 0], ...]}
+
+
+def horizontal_paylines(rows, cols):
+    return [[row] * cols for row in range(rows)]
+
+
+def standard_paylines(rows, cols, count):
+    # Every connected line (the row moves by at most one between columns),
+    # classic shapes first: straight lines, then symmetric Vs and zig-zags,
+    # then the lopsided ones.
+    def shape_key(line):
+        steps = [b - a for a, b in zip(line, line[1:])]
+        moves = [step for step in steps if step]
+        turns = sum(1 for a, b in zip(moves, moves[1:]) if a != b)
+        return (bool(moves), list(line) != list(line[::-1]), turns, -sum(map(abs, steps)), line)
+
+    lines = [list(line) for line in itertools.product(range(rows), repeat=cols)
+             if all(abs(b - a) <= 1 for a, b in zip(line, line[1:]))]
+    lines.sort(key=shape_key)
+    if count > len(lines):
+        raise ValueError(f"Only {len(lines)} connected paylines exist on a {cols}x{rows} machine.")
+    return lines[:count]
+
+
+def validate_paylines(paylines, rows, cols):
+    for number, line in enumerate(paylines, start=1):
+        if len(line) != cols:
+            raise ValueError(f"Payline {number} has {len(line)} columns, expected {cols}.")
+        if not all(0 <= row < rows for row in line):
+            raise ValueError(f"Payline {number} leaves the {rows} rows of the machine.")
+    return paylines
+
+
+def load_paylines(path):
+    with open(path, "r") as f:
+        spec = json.load(f)
+    rows, cols = spec["rows"], spec["cols"]
+    return rows, cols, validate_paylines(spec["paylines"], rows, cols)
+
+
+def save_paylines(path, rows, cols, paylines):
+    with open(path, "w") as f:
+        json.dump({"rows": rows, "cols": cols, "paylines": paylines}, f)
+
+
+def check_paylines(columns, paylines, bet, values):
+    # Scalar reference version of PaylineEvaluator, in the style of check_winnings.
+    winnings = 0
+    winning_lines = []
+    for number, line in enumerate(paylines, start=1):
+        symbol = columns[0][line[0]]
+        if all(column[row] == symbol for column, row in zip(columns, line)):
+            winnings += values[symbol] * bet
+            winning_lines.append(number)
+    return winnings, winning_lines
+
+
+class PaylineEvaluator:
+    def __init__(self, paylines, rows, cols, values):
+        validate_paylines(paylines, rows, cols)
+        self.paylines = paylines
+        self.rows = rows
+        self.cols = cols
+        self.values = np.asarray(values)
+        # Precompiled (line, column) -> (column, row) cell lookups.
+        self.cell_cols = np.broadcast_to(np.arange(cols), (len(paylines), cols))
+        self.cell_rows = np.array(paylines, dtype=np.intp).reshape(len(paylines), cols)
+        self.line_numbers = np.arange(len(paylines))
+
+    def __len__(self):
+        return len(self.paylines)
+
+    def evaluate(self, grids, lines=None, bet=1):
+        # grids: (n, cols, rows) symbol ids. Gathers every payline's cells in
+        # one fancy-index, so the work never loops over lines in Python.
+        cells = grids.transpose(1, 2, 0)[self.cell_cols, self.cell_rows]
+        first = cells[:, 0]
+        hits = np.ones(first.shape, dtype=bool)
+        for col in range(1, self.cols):
+            hits &= cells[:, col] == first
+        if lines is not None:
+            lines = np.asarray(lines)
+            hits &= self.line_numbers[:, None] < (lines if lines.ndim == 0 else lines[None, :])
+        payouts = np.where(hits, self.values[first], 0).sum(axis=0) * bet
+        return payouts, hits.T
@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import json
+import time
+from fractions import Fraction
+from functools import lru_cache
+
+from slot_machine import COLS, MAX_LINES, ROWS, symbol_count, symbol_value
+
+
+def paytable_key(rows, cols, symbols, values):
+    return (rows, cols,
+            tuple(sorted(symbols.items())),
+            tuple(sorted((name, values[name]) for name in symbols)))
+
+
+def paytable_hash(rows, cols, symbols, values):
+    text = json.dumps(paytable_key(rows, cols, symbols, values))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def column_outcomes(counts, depth):
+    # Every ordered run of `depth` symbols a column can show, weighted by the
+    # number of ordered position draws that produce it. The weights sum to
+    # N * (N - 1) * ... * (N - depth + 1).
+    outcomes = [((), 1)]
+    for _ in range(depth):
+        extended = []
+        for run, weight in outcomes:
+            for index, count in enumerate(counts):
+                remaining = count - run.count(index)
+                if remaining > 0:
+                    extended.append((run + (index,), weight * remaining))
+        outcomes = extended
+    return outcomes
+
+
+@lru_cache(maxsize=256)
+def _line_distribution(key, lines):
+    rows, cols, symbols, values = key
+    counts = [count for _, count in symbols]
+    multipliers = [value for _, value in values]
+    if not 1 <= lines <= rows:
+        raise ValueError(f"lines must be between 1 and {rows}.")
+    if rows > sum(counts):
+        raise ValueError("Not enough symbols on the reel to fill every row.")
+
+    # Only the first `lines` rows are scored, and the first draws of a column
+    # are distributed the same whether or not more rows are drawn after them.
+    outcomes = column_outcomes(counts, lines)
+    denominator = 1
+    for i in range(lines):
+        denominator *= sum(counts) - i
+    denominator **= cols
+
+    # State: the symbol each line still matches, or None once it is broken.
+    states = dict(outcomes)
+    for _ in range(cols - 1):
+        merged = {}
+        for state, weight in states.items():
+            for run, run_weight in outcomes:
+                new_state = tuple(s if s == r else None for s, r in zip(state, run))
+                merged[new_state] = merged.get(new_state, 0) + weight * run_weight
+        states = merged
+
+    pmf = {}
+    line_hits = [0] * lines
+    for state, weight in states.items():
+        multiplier = sum(multipliers[s] for s in state if s is not None)
+        pmf[multiplier] = pmf.get(multiplier, 0) + weight
+        for line, s in enumerate(state):
+            if s is not None:
+                line_hits[line] += weight
+    return denominator, tuple(sorted(pmf.items())), tuple(line_hits)
+
+
+def analyze(rows=ROWS, cols=COLS, symbols=symbol_count, values=symbol_value,
+            lines=MAX_LINES, bet=1):
+    key = paytable_key(rows, cols, symbols, values)
+    denominator, weights, line_hits = _line_distribution(key, lines)
+    pmf = {multiplier * bet: Fraction(weight, denominator) for multiplier, weight in weights}
+    mean = sum(payout * p for payout, p in pmf.items())
+    variance = sum(payout * payout * p for payout, p in pmf.items()) - mean * mean
+    return {
+        "paytable": paytable_hash(rows, cols, symbols, values),
+        "lines": lines,
+        "bet": bet,
+        "pmf": pmf,
+        "rtp": mean / (lines * bet),
+        "mean_payout": mean,
+        "payout_variance": variance,
+        "hit_frequency": 1 - pmf.get(0, Fraction(0)),
+        "line_hit_rates": [Fraction(hits, denominator) for hits in line_hits],
+    }
+
+
+def print_report(report):
+    print(f"Paytable {report['paytable'][:12]} ({report['lines']} lines at £{report['bet']})")
+    print(f"RTP: {report['rtp']} = {float(report['rtp']):.9%}")
+    print(f"Payout variance: {float(report['payout_variance']):.9f}")
+    print(f"Hit frequency: {float(report['hit_frequency']):.9%}")
+    for line, rate in enumerate(report["line_hit_rates"], start=1):
+        print(f"Line {line} hit rate: {float(rate):.9%}")
+    print("Payout distribution:")
+    for payout, p in sorted(report["pmf"].items()):
+        print(f"  £{payout}: {p} ({float(p):.9f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact payout distribution for the slot_machine.py paytable")
+    parser.add_argument("--lines", type=int, default=MAX_LINES)
+    parser.add_argument("--bet", type=int, default=1)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = analyze(lines=args.lines, bet=args.bet)
+    elapsed = time.perf_counter() - start
+    print_report(report)
+    print(f"Elapsed: {elapsed * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from slot_analyzer import analyze
+from slot_machine import (COLS, MAX_BET, MAX_LINES, MIN_BET, ROWS, get_reel_model,
+                          symbol_count, symbol_value)
+from slot_simulator import build_values, evaluate_batch
+
+STRATEGIES = ("flat", "martingale", "max-lines")
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+SESSION_CHUNK = 1_000_000
+
+
+class ExactSampler:
+    # Per-spin payouts are i.i.d., so a spin can be drawn straight from the
+    # exact payout distribution with one uniform and a search over its CDF.
+    def __init__(self, lines):
+        pmf = sorted(analyze(lines=lines, bet=1)["pmf"].items())
+        self.multipliers = np.array([payout for payout, _ in pmf], dtype=np.int64)
+        self.cdf = np.cumsum([float(p) for _, p in pmf])
+
+    def draw(self, n, rng):
+        index = np.searchsorted(self.cdf, rng.random(n), side="right")
+        return self.multipliers[np.minimum(index, len(self.multipliers) - 1)]
+
+
+class ReelSampler:
+    # Spins the real reels; slower, but useful to cross-check ExactSampler.
+    def __init__(self, lines):
+        self.lines = lines
+        self.model = get_reel_model(ROWS, COLS, symbol_count)
+        self.values = build_values(self.model.names, symbol_value)
+
+    def draw(self, n, rng):
+        payouts, _ = evaluate_batch(self.model.spin_batch(n, rng), self.lines, 1, self.values)
+        return payouts
+
+
+def run_chunk(sessions, spins, strategy, deposit, lines, bet, target, sampler, rng, checkpoints):
+    final = np.full(sessions, deposit, dtype=np.int64)
+    length = np.full(sessions, spins, dtype=np.int64)
+    ruined = np.zeros(sessions, dtype=bool)
+    survivors = np.zeros(spins + 1, dtype=np.int64)
+    snapshots = []
+
+    # Only sessions still playing are kept in these compacted arrays; the
+    # others are written to final/length when they stop.
+    ids = np.arange(sessions)
+    balance = final.copy()
+    stake = np.minimum(bet, balance // lines)
+    survivors[0] = sessions
+    for spin in range(1, spins + 1):
+        if len(ids):
+            total = stake * lines
+            winnings = sampler.draw(len(ids), rng) * stake
+            balance += winnings - total
+            if strategy == "martingale":
+                stake = np.where(winnings < total, np.minimum(stake * 2, MAX_BET), bet)
+                stake = np.minimum(stake, balance // lines)
+            else:
+                stake = np.minimum(bet, balance // lines)
+
+            broke = stake < MIN_BET
+            done = broke if target is None else broke | (balance >= target)
+            if done.any():
+                stopped = ids[done]
+                final[stopped] = balance[done]
+                length[stopped] = spin
+                ruined[stopped] = broke[done]
+                keep = ~done
+                ids, balance, stake = ids[keep], balance[keep], stake[keep]
+        survivors[spin] = sessions - np.count_nonzero(ruined)
+        if spin in checkpoints:
+            snapshot = final.copy()
+            snapshot[ids] = balance
+            # Balances never go negative, so a bincount is an exact summary
+            # that chunks can add together.
+            snapshots.append(np.bincount(snapshot))
+    final[ids] = balance
+    return survivors, snapshots, final, length, ruined
+
+
+def merge_histograms(a, b):
+    merged = np.zeros(max(len(a), len(b)), dtype=np.int64)
+    merged[:len(a)] += a
+    merged[:len(b)] += b
+    return merged
+
+
+def histogram_percentiles(histogram, percentiles):
+    # Same linear interpolation as np.percentile, read off the counts.
+    cumulative = np.cumsum(histogram)
+    positions = (cumulative[-1] - 1) * np.asarray(percentiles) / 100
+    lower = np.searchsorted(cumulative, np.floor(positions), side="right")
+    upper = np.searchsorted(cumulative, np.ceil(positions), side="right")
+    return (lower + (upper - lower) * (positions - np.floor(positions))).tolist()
+
+
+def simulate_sessions(sessions, spins, strategy="flat", deposit=100, lines=MAX_LINES, bet=1,
+                      target=None, seed=None, report_every=50, sampler="exact",
+                      chunk_size=SESSION_CHUNK):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    if strategy == "max-lines":
+        lines = MAX_LINES
+    draw = ExactSampler(lines) if sampler == "exact" else ReelSampler(lines)
+    rng = np.random.default_rng(seed)
+    checkpoints = sorted(set(range(report_every, spins + 1, report_every)) | {spins})
+
+    survivors = np.zeros(spins + 1, dtype=np.int64)
+    histograms = [np.zeros(1, dtype=np.int64) for _ in checkpoints]
+    finals, lengths, ruins = [], [], []
+    for start in range(0, sessions, chunk_size):
+        n = min(chunk_size, sessions - start)
+        chunk = run_chunk(n, spins, strategy, deposit, lines, bet, target, draw, rng, set(checkpoints))
+        survivors += chunk[0]
+        histograms = [merge_histograms(total, part) for total, part in zip(histograms, chunk[1])]
+        finals.append(chunk[2])
+        lengths.append(chunk[3])
+        ruins.append(chunk[4])
+
+    final = np.concatenate(finals)
+    length = np.concatenate(lengths)
+    ruined = np.concatenate(ruins)
+    return {
+        "sessions": sessions,
+        "spins": spins,
+        "strategy": strategy,
+        "deposit": deposit,
+        "lines": lines,
+        "bet": bet,
+        "survival": (survivors / sessions).tolist(),
+        "checkpoints": checkpoints,
+        "balance_percentiles": [histogram_percentiles(h, PERCENTILES) for h in histograms],
+        "ruin_rate": float(ruined.mean()),
+        "ruin_spin_percentiles": np.percentile(length[ruined], PERCENTILES).tolist() if ruined.any() else [],
+        "session_length_percentiles": np.percentile(length, PERCENTILES).tolist(),
+        "final_balance_mean": float(final.mean()),
+    }
+
+
+def print_report(report):
+    print(f"{report['sessions']:,} sessions x {report['spins']:,} spins, {report['strategy']} strategy "
+          f"({report['lines']} lines at £{report['bet']}, £{report['deposit']} deposit)")
+    print(f"Ruined: {report['ruin_rate']:.4%}")
+    labels = " ".join(f"p{p:>2}".rjust(8) for p in PERCENTILES)
+    print(f"{'spin':>6} {'survival':>9} {labels}")
+    for spin, row in zip(report["checkpoints"], report["balance_percentiles"]):
+        values = " ".join(f"{v:8.0f}" for v in row)
+        print(f"{spin:>6} {report['survival'][spin]:9.4%} {values}")
+    if report["ruin_spin_percentiles"]:
+        print("Spins to ruin:", " ".join(f"p{p}={v:.0f}" for p, v in zip(PERCENTILES, report["ruin_spin_percentiles"])))
+    print("Session length:", " ".join(f"p{p}={v:.0f}" for p, v in zip(PERCENTILES, report["session_length_percentiles"])))
+    print(f"Mean final balance: £{report['final_balance_mean']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized bankroll and ruin simulator for slot sessions")
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument("--spins", type=int, default=1000)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="flat")
+    parser.add_argument("--deposit", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=MAX_LINES)
+    parser.add_argument("--bet", type=int, default=MIN_BET)
+    parser.add_argument("--target", type=int, default=None, help="quit once the balance reaches this")
+    parser.add_argument("--report-every", type=int, default=50)
+    parser.add_argument("--sampler", choices=("exact", "reels"), default="exact")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", default=None, help="write the full curves to this file")
+    args = parser.parse_args()
+
+    if not 1 <= args.lines <= MAX_LINES:
+        parser.error(f"--lines must be between 1 and {MAX_LINES}")
+    if not MIN_BET <= args.bet <= MAX_BET:
+        parser.error(f"--bet must be between {MIN_BET} and {MAX_BET}")
+
+    start = time.perf_counter()
+    report = simulate_sessions(args.sessions, args.spins, args.strategy, args.deposit, args.lines,
+                               args.bet, args.target, args.seed, args.report_every, args.sampler)
+    elapsed = time.perf_counter() - start
+    print_report(report)
+    print(f"Elapsed: {elapsed:.2f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f)
+
+
+if __name__ == "__main__":
+    main()
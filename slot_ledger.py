@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from slot_machine import COLS, MAX_LINES, ROWS, get_reel_model, symbol_count, symbol_value
+from slot_simulator import build_values, evaluate_batch
+
+MAGIC = b"SLOTLDG1"
+HEADER_SIZE = 512
+SYNC_EVERY = 4096
+AUDIT_CHUNK = 1 << 20
+
+
+def record_dtype(rows, cols):
+    return np.dtype([
+        ("seq", "<u8"),
+        ("time_ns", "<i8"),
+        ("bet", "<u4"),
+        ("winnings", "<u4"),
+        ("line_mask", "<u8"),
+        ("lines", "u1"),
+        ("reels", "u1", (cols, rows)),
+    ])
+
+
+def encode_header(rows, cols, symbols, values):
+    meta = json.dumps({
+        "rows": rows,
+        "cols": cols,
+        "symbols": list(symbols),
+        "values": [values[name] for name in symbols],
+    }).encode()
+    header = MAGIC + struct.pack("<I", len(meta)) + meta
+    if len(header) > HEADER_SIZE:
+        raise ValueError("Paytable is too large for the ledger header.")
+    return header.ljust(HEADER_SIZE, b"\0")
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+        raise ValueError(f"{path} is not a spin ledger.")
+    (length,) = struct.unpack_from("<I", header, len(MAGIC))
+    start = len(MAGIC) + 4
+    return json.loads(header[start:start + length])
+
+
+class LedgerWriter:
+    def __init__(self, path, rows=ROWS, cols=COLS, symbols=symbol_count,
+                 values=symbol_value, sync_every=SYNC_EVERY):
+        self.path = path
+        self.names = list(symbols)
+        self.symbol_ids = {name: i for i, name in enumerate(self.names)}
+        self.dtype = record_dtype(rows, cols)
+        self.sync_every = sync_every
+        self.pending = []
+        self.pending_count = 0
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            # read_header rejects anything that is not a complete ledger
+            # header, so an existing file is never overwritten.
+            meta = read_header(path)
+            layout = (meta["rows"], meta["cols"], meta["symbols"], meta["values"])
+            if layout != (rows, cols, self.names, [values[name] for name in self.names]):
+                raise ValueError(f"{path} was written for a different machine layout or paytable.")
+            records = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+            self.file = open(path, "r+b")
+            # Drop any torn record left by a crash before appending.
+            self.file.truncate(HEADER_SIZE + records * self.dtype.itemsize)
+            self.file.seek(0, os.SEEK_END)
+            self.seq = records
+        else:
+            self.file = open(path, "wb")
+            self.file.write(encode_header(rows, cols, symbols, values))
+            self.seq = 0
+            self.flush()
+
+    def record(self, columns, lines, bet, winnings, winning_lines):
+        record = np.zeros(1, dtype=self.dtype)
+        record["seq"] = self.seq
+        record["time_ns"] = time.time_ns()
+        record["bet"] = bet
+        record["winnings"] = winnings
+        record["line_mask"] = sum(1 << (line - 1) for line in winning_lines)
+        record["lines"] = lines
+        record["reels"] = [[self.symbol_ids[symbol] for symbol in column] for column in columns]
+        self.append(record)
+
+    def record_batch(self, grids, lines, bets, winnings, hits):
+        n = len(grids)
+        records = np.zeros(n, dtype=self.dtype)
+        records["seq"] = np.arange(self.seq, self.seq + n)
+        records["time_ns"] = time.time_ns()
+        records["bet"] = bets
+        records["winnings"] = winnings
+        records["line_mask"] = (hits.astype(np.uint64) << np.arange(hits.shape[1], dtype=np.uint64)).sum(axis=1)
+        records["lines"] = lines
+        records["reels"] = grids
+        self.append(records)
+
+    def append(self, records):
+        self.pending.append(records.tobytes())
+        self.pending_count += len(records)
+        self.seq += len(records)
+        if self.pending_count >= self.sync_every:
+            self.flush()
+
+    def flush(self):
+        # One write and one fsync for everything buffered since the last flush.
+        if self.pending:
+            self.file.write(b"".join(self.pending))
+            self.pending = []
+            self.pending_count = 0
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LedgerReader:
+    def __init__(self, path):
+        self.meta = read_header(path)
+        self.names = self.meta["symbols"]
+        self.values = np.array(self.meta["values"], dtype=np.int64)
+        self.dtype = record_dtype(self.meta["rows"], self.meta["cols"])
+        count = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r",
+                                     offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def audit(self, chunk_size=AUDIT_CHUNK):
+        # Walk the mapping in fixed-size slices so only one chunk of pages is
+        # touched at a time, whatever the size of the ledger.
+        rows = self.meta["rows"]
+        wagered = 0
+        won = 0
+        hits = 0
+        symbol_wins = np.zeros(len(self.names), dtype=np.int64)
+        symbol_amounts = np.zeros(len(self.names), dtype=np.int64)
+        for start in range(0, len(self.records), chunk_size):
+            chunk = self.records[start:start + chunk_size]
+            bets = chunk["bet"].astype(np.int64)
+            masks = chunk["line_mask"]
+            wagered += int(bets @ chunk["lines"].astype(np.int64))
+            won += int(chunk["winnings"].sum(dtype=np.int64))
+            hits += int(np.count_nonzero(masks))
+            first = chunk["reels"][:, 0, :]
+            for line in range(rows):
+                winners = (masks >> np.uint64(line)) & np.uint64(1) == 1
+                symbols = first[winners, line]
+                symbol_wins += np.bincount(symbols, minlength=len(self.names))
+                symbol_amounts += np.bincount(symbols, weights=bets[winners] * self.values[symbols],
+                                              minlength=len(self.names)).astype(np.int64)
+        return {
+            "records": len(self.records),
+            "total_wagered": wagered,
+            "total_won": won,
+            "rtp": won / wagered if wagered else 0.0,
+            "hit_frequency": hits / len(self.records) if len(self.records) else 0.0,
+            "symbol_wins": {name: int(count) for name, count in zip(self.names, symbol_wins)},
+            "symbol_amounts": {name: int(amount) for name, amount in zip(self.names, symbol_amounts)},
+        }
+
+
+def generate(path, spins, lines=MAX_LINES, bet=1, seed=None, batch_size=1_000_000):
+    model = get_reel_model(ROWS, COLS, symbol_count)
+    values = build_values(model.names, symbol_value)
+    rng = np.random.default_rng(seed)
+    with LedgerWriter(path, sync_every=batch_size) as ledger:
+        remaining = spins
+        while remaining > 0:
+            n = min(batch_size, remaining)
+            grids = model.spin_batch(n, rng)
+            payouts, hits = evaluate_batch(grids, lines, bet, values)
+            ledger.record_batch(grids, lines, bet, payouts, hits)
+            remaining -= n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append-only spin ledger tools")
+    parser.add_argument("command", choices=["audit", "generate"])
+    parser.add_argument("path")
+    parser.add_argument("--spins", type=int, default=10_000_000, help="spins to generate")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "generate":
+        generate(args.path, args.spins, seed=args.seed)
+        print(f"Wrote {args.spins:,} spins to {args.path}")
+    else:
+        report = LedgerReader(args.path).audit()
+        print(f"Records: {report['records']:,}")
+        print(f"Total wagered: £{report['total_wagered']:,}")
+        print(f"Total won: £{report['total_won']:,}")
+        print(f"RTP: {report['rtp']:.6%}")
+        print(f"Hit frequency: {report['hit_frequency']:.6%}")
+        for name in report["symbol_wins"]:
+            print(f"  {name}: {report['symbol_wins'][name]:,} line wins, £{report['symbol_amounts'][name]:,}")
+    print(f"Elapsed: {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import random
+import sys
 
 
 MAX_LINES = 3
@@ -40,24 +41,103 @@ def check_winnings(columns, lines, bet, values):
 
 
 
-def get_slot_machine_spin(rows, cols, symbols):
-    all_symbols = []
-    for symbol, symbol_count in symbols.items():
-        for _ in range(symbol_count):
-           all_symbols.append(symbol)
+# Largest number of ordered draws a column may have before spin_batch falls
+# back from a lookup table to sequential sampling.
+DRAW_TABLE_LIMIT = 1 << 20
+
+
+class ReelModel:
+    def __init__(self, rows, cols, symbols):
+        self.rows = rows
+        self.cols = cols
+        self.names = list(symbols)
+        self.reel = [name for name in self.names for _ in range(symbols[name])]
+        if rows > len(self.reel):
+            raise ValueError("Not enough symbols on the reel to fill every row.")
+        self.reel_ids = [self.names.index(name) for name in self.reel]
+        self.buffer = self.reel[:]
+        self.draw_table = None
+
+        draws = 1
+        for i in range(rows):
+            draws *= len(self.reel) - i
+        self.draws = draws
 
-    columns = []
-    for _ in range(cols):
-        column =[]
-        current_symbols = all_symbols[:]
-        for _ in range(rows):
-            value = random.choice(current_symbols)
-            current_symbols.remove(value)
-            column.append(value)
+    def spin(self, rng=random):
+        # Partial Fisher-Yates on a reusable buffer: after each swap the
+        # buffer is still a permutation of the reel, so it never needs a reset.
+        buffer = self.buffer
+        size = len(buffer)
+        columns = []
+        for _ in range(self.cols):
+            for row in range(self.rows):
+                j = rng.randrange(row, size)
+                buffer[row], buffer[j] = buffer[j], buffer[row]
+            columns.append(buffer[:self.rows])
+        return columns
 
-        columns.append(column)
+    def build_draw_table(self):
+        # One entry per ordered draw of `rows` distinct reel positions, so a
+        # uniform index into the table is an exact sample of a column.
+        import itertools
+        import numpy as np
+
+        ids = np.array(self.reel_ids, dtype=np.uint8)
+        positions = np.array(list(itertools.permutations(range(len(ids)), self.rows)),
+                             dtype=np.intp).reshape(-1, self.rows)
+        return np.ascontiguousarray(ids[positions].T)
+
+    def spin_batch(self, n, rng=None):
+        import numpy as np
+
+        if rng is None:
+            rng = np.random.default_rng()
+        if self.draws <= DRAW_TABLE_LIMIT:
+            if self.draw_table is None:
+                self.draw_table = self.build_draw_table()
+            index = rng.integers(0, self.draws, size=(self.cols, n),
+                                 dtype=np.min_scalar_type(self.draws - 1))
+            grids = np.take(self.draw_table, index, axis=1)
+        else:
+            grids = self.sample_sequential(n, rng)
+        # Stored row-major per (row, column) so each cell is contiguous over spins.
+        return grids.transpose(2, 1, 0)
 
-    return columns
+    def sample_sequential(self, n, rng):
+        # Draw a rank among the remaining positions, then step it past every
+        # position already taken (in ascending order) to get the real index.
+        import numpy as np
+
+        size = len(self.reel_ids)
+        dtype = np.min_scalar_type(size)
+        picks = np.empty((self.rows, self.cols, n), dtype=dtype)
+        ordered = []
+        for row in range(self.rows):
+            index = rng.integers(0, size - row, size=(self.cols, n), dtype=dtype)
+            for taken in ordered:
+                index += index >= taken
+            picks[row] = index
+            # Insert the new pick into the sorted list with a min/max pass.
+            carry = index
+            for k, taken in enumerate(ordered):
+                ordered[k], carry = np.minimum(taken, carry), np.maximum(taken, carry)
+            ordered.append(carry)
+        return np.array(self.reel_ids, dtype=np.uint8)[picks]
+
+
+reel_models = {}
+
+
+def get_reel_model(rows, cols, symbols):
+    key = (rows, cols, tuple(symbols.items()))
+    model = reel_models.get(key)
+    if model is None:
+        model = reel_models[key] = ReelModel(rows, cols, symbols)
+    return model
+
+
+def get_slot_machine_spin(rows, cols, symbols):
+    return get_reel_model(rows, cols, symbols).spin()
 
 def print_slot_machine(columns):
     for row in range(len(columns[0])):
@@ -70,6 +150,41 @@ def print_slot_machine(columns):
         print()
 
 
+class SlotSession:
+    def __init__(self, balance=0, ledger=None):
+        self.balance = balance
+        self.ledger = ledger
+
+    def deposit(self, amount):
+        if amount <= 0:
+            raise ValueError("Amount must be greater than 0.")
+        self.balance += amount
+        return self.balance
+
+    def check_bet(self, lines, bet):
+        if not 1 <= lines <= MAX_LINES:
+            raise ValueError("Enter a valid number of lines.")
+        if not MIN_BET <= bet <= MAX_BET:
+            raise ValueError(f"Amount must be between £{MIN_BET} - £{MAX_BET}.")
+        total_bet = bet * lines
+        if total_bet > self.balance:
+            raise ValueError(f"You do not have enough to bet that amount, your current balance is: £{self.balance}")
+        return total_bet
+
+    def settle(self, lines, bet, winnings):
+        self.balance += winnings - bet * lines
+        return self.balance
+
+    def spin(self, lines, bet):
+        self.check_bet(lines, bet)
+        slots = get_slot_machine_spin(ROWS, COLS, symbol_count)
+        winnings, winning_lines = check_winnings(slots, lines, bet, symbol_value)
+        self.settle(lines, bet, winnings)
+        if self.ledger is not None:
+            self.ledger.record(slots, lines, bet, winnings, winning_lines)
+        return slots, winnings, winning_lines
+
+
 def deposit():
     while True:
         amount = input("What would you like to deposit? £")
@@ -110,36 +225,48 @@ def get_bet():
             print("Please enter a number. ")
     return amount
 
-def spin(balance):
+def spin(balance, ledger=None):
+    session = SlotSession(balance, ledger)
     lines = get_number_of_lines()
     while True:
         bet = get_bet()
-        total_bet = bet * lines
-
-        if total_bet > balance:
-            print(f"You do not have enough to bet that amount, your current balance is: £{balance}")
+        try:
+            total_bet = session.check_bet(lines, bet)
+        except ValueError as error:
+            print(error)
         else:
             break
 
     print(
         f"You are betting £{bet} on {lines}. Total bet is equal to: £{total_bet}")
 
-    slots = get_slot_machine_spin(ROWS, COLS, symbol_count)
+    slots, winnings, winning_lines = session.spin(lines, bet)
     print_slot_machine(slots)
-    winnings, winning_lines = check_winnings(slots, lines, bet, symbol_value)
     print(f"You won £{winnings}.")
     print(f"You won on lines:", *winning_lines)
-    return winnings - total_bet
+    return session.balance - balance
 
-def main():
-    balance = deposit()
-    while True:
-        print(f"Current balance is £{balance}")
-        answer = input("Press enter to play (q to quit).")
-        if answer == "q":
-            break
-        balance += spin(balance)
+def main(ledger_path=None):
+    ledger = None
+    if ledger_path:
+        # Imported here so plain play does not need NumPy.
+        from slot_ledger import LedgerWriter
+        ledger = LedgerWriter(ledger_path)
+
+    try:
+        balance = deposit()
+        while True:
+            print(f"Current balance is £{balance}")
+            answer = input("Press enter to play (q to quit).")
+            if answer == "q":
+                break
+            balance += spin(balance, ledger)
 
-    print(f"You left with £{balance}")
+        print(f"You left with £{balance}")
+    finally:
+        if ledger is not None:
+            ledger.close()
 
-main()
+if __name__ == "__main__":
+    # Optional argument: path of a spin ledger to record every spin to.
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,87 @@
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from slot_machine import COLS, MAX_LINES, ROWS, symbol_count, symbol_value
+from slot_simulator import (BATCH_SIZE, RunningStats, print_report, resolve_paylines,
+                            simulate, summarize)
+
+# Work is always cut into chunks of this many spins, each with its own seed
+# stream, so the worker count never changes which random numbers are drawn.
+CHUNK_SIZE = 10_000_000
+
+
+def plan_chunks(spins, master_seed, chunk_size=CHUNK_SIZE):
+    count = -(-spins // chunk_size)
+    seeds = np.random.SeedSequence(master_seed).spawn(count)
+    return [(min(chunk_size, spins - i * chunk_size), seed) for i, seed in enumerate(seeds)]
+
+
+def run_chunk(task):
+    spins, seed, lines, bet, rows, cols, symbols, values, batch_size, paylines = task
+    return simulate(spins, lines, bet, rows, cols, symbols, values,
+                    seed=seed, batch_size=batch_size, paylines=paylines)
+
+
+def simulate_parallel(spins, master_seed, lines=MAX_LINES, bet=1, rows=ROWS, cols=COLS,
+                      symbols=symbol_count, values=symbol_value, workers=None,
+                      chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, paylines=None):
+    tasks = [(n, seed, lines, bet, rows, cols, symbols, values, batch_size, paylines)
+             for n, seed in plan_chunks(spins, master_seed, chunk_size)]
+    stats = RunningStats(lines)
+    if workers == 1:
+        for chunk in map(run_chunk, tasks):
+            stats.merge(chunk)
+        return stats
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in submission order, so the merge order is fixed.
+        for chunk in pool.map(run_chunk, tasks):
+            stats.merge(chunk)
+    return stats
+
+
+def digest(stats):
+    h = hashlib.sha256()
+    h.update(np.array([stats.count, stats.hit_count], dtype=np.int64).tobytes())
+    h.update(np.array([stats.mean, stats.m2], dtype=np.float64).tobytes())
+    h.update(stats.line_hits.astype(np.int64).tobytes())
+    h.update(np.trim_zeros(stats.histogram, "b").astype(np.int64).tobytes())
+    return h.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process slot certification run")
+    parser.add_argument("--spins", type=int, default=1_000_000_000)
+    parser.add_argument("--lines", type=int, default=None)
+    parser.add_argument("--bet", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0, help="master seed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--paylines", default=None,
+                        help="JSON payline file, or 'standard:COLSxROWS:COUNT'")
+    args = parser.parse_args()
+
+    rows, cols, paylines = resolve_paylines(args.paylines)
+    max_lines = MAX_LINES if paylines is None else len(paylines)
+    lines = args.lines or max_lines
+    if not 1 <= lines <= max_lines:
+        parser.error(f"--lines must be between 1 and {max_lines}")
+
+    start = time.perf_counter()
+    stats = simulate_parallel(args.spins, args.seed, lines, args.bet, rows, cols,
+                              workers=args.workers, chunk_size=args.chunk_size,
+                              paylines=paylines)
+    elapsed = time.perf_counter() - start
+    print_report(summarize(stats, lines, args.bet))
+    print(f"Result digest: {digest(stats)}")
+    print(f"Elapsed: {elapsed:.2f}s with {args.workers} workers "
+          f"({args.spins / elapsed:,.0f} spins/s)")
+
+
+if __name__ == "__main__":
+    main()
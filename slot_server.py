@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import json
+import signal
+import statistics
+import time
+
+import numpy as np
+
+from slot_machine import (COLS, ROWS, SlotSession, get_reel_model,
+                          symbol_count, symbol_value)
+from slot_ledger import LedgerWriter
+from slot_simulator import build_values, evaluate_batch
+
+
+class SpinEngine:
+    def __init__(self, rows=ROWS, cols=COLS, symbols=symbol_count, values=symbol_value, seed=None,
+                 ledger=None):
+        self.rows = rows
+        self.ledger = ledger
+        self.model = get_reel_model(rows, cols, symbols)
+        self.names = np.array(self.model.names)
+        self.values = build_values(self.model.names, values)
+        self.line_numbers = np.arange(rows)
+        self.rng = np.random.default_rng(seed)
+
+    def spin_many(self, sessions, lines, bets):
+        # One vectorized draw and evaluation for every spin in the batch;
+        # each spin scores only its own lines at its own bet.
+        lines = np.asarray(lines)
+        bets = np.asarray(bets)
+        grids = self.model.spin_batch(len(sessions), self.rng)
+        _, hits = evaluate_batch(grids, self.rows, 1, self.values)
+        hits = hits & (self.line_numbers < lines[:, None])
+        winnings = (np.where(hits, self.values[grids[:, 0, :]], 0) * bets[:, None]).sum(axis=1)
+        if self.ledger is not None:
+            self.ledger.record_batch(grids, lines, bets, winnings, hits)
+
+        results = []
+        reels = self.names[grids].tolist()
+        for i, session in enumerate(sessions):
+            won = int(winnings[i])
+            session.settle(int(lines[i]), int(bets[i]), won)
+            results.append({
+                "ok": True,
+                "reels": reels[i],
+                "winnings": won,
+                "lines": (np.flatnonzero(hits[i]) + 1).tolist(),
+                "balance": session.balance,
+            })
+        return results
+
+
+class SlotServer:
+    def __init__(self, engine):
+        self.engine = engine
+        self.pending = []
+        self.flush_scheduled = False
+        self.batches = 0
+        self.spins = 0
+
+    def submit_spin(self, session, lines, bet):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((session, lines, bet, future))
+        if not self.flush_scheduled:
+            # Everything submitted before the loop gets back to this callback
+            # is coalesced into the same batch.
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+        return future
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        self.flush_scheduled = False
+        sessions, lines, bets, futures = zip(*pending)
+        try:
+            results = self.engine.spin_many(sessions, lines, bets)
+        except Exception as error:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        self.spins += len(pending)
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def handle_request(self, session, request):
+        op = request.get("op")
+        if op == "balance":
+            return {"ok": True, "balance": session.balance}
+        if op == "deposit":
+            session.deposit(int(request["amount"]))
+            return {"ok": True, "balance": session.balance}
+        if op == "spin":
+            lines = int(request.get("lines", 1))
+            bet = int(request.get("bet", 1))
+            session.check_bet(lines, bet)
+            return await self.submit_spin(session, lines, bet)
+        raise ValueError(f"Unknown op: {op}")
+
+    async def handle_client(self, reader, writer):
+        session = SlotSession()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(session, json.loads(line))
+                except (ValueError, KeyError, TypeError) as error:
+                    response = {"ok": False, "error": str(error)}
+                except Exception as error:
+                    # A failed batch reaches every spin in it; answer each
+                    # player instead of dropping their connection.
+                    response = {"ok": False, "error": f"Spin failed: {type(error).__name__}: {error}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle_client, path=unix_path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+
+async def open_client(host, port, unix_path):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def run_player(host, port, unix_path, spins, latencies):
+    reader, writer = await open_client(host, port, unix_path)
+    writer.write(json.dumps({"op": "deposit", "amount": spins * 100}).encode() + b"\n")
+    await reader.readline()
+    request = json.dumps({"op": "spin", "lines": 3, "bet": 1}).encode() + b"\n"
+    for _ in range(spins):
+        start = time.perf_counter()
+        writer.write(request)
+        await reader.readline()
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load_test(clients, spins, host="127.0.0.1", port=0, unix_path=None, seed=None):
+    server = None
+    if not unix_path and port == 0:
+        # No target given: serve from this process on an ephemeral port.
+        slot_server = SlotServer(SpinEngine(seed=seed))
+        server = await slot_server.start(host, 0)
+        port = server.sockets[0].getsockname()[1]
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_player(host, port, unix_path, spins, latencies)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"Players: {clients}, spins: {len(latencies):,}")
+    print(f"Throughput: {len(latencies) / elapsed:,.0f} spins/s")
+    print(f"Latency p50: {cuts[49] * 1000:.2f}ms, p99: {cuts[98] * 1000:.2f}ms")
+    if server is not None:
+        print(f"Average batch size: {slot_server.spins / slot_server.batches:.1f}")
+
+
+async def serve(host, port, unix_path, seed, ledger_path=None):
+    ledger = LedgerWriter(ledger_path) if ledger_path else None
+    server = await SlotServer(SpinEngine(seed=seed, ledger=ledger)).start(host, port, unix_path)
+    print(f"Serving on {unix_path or f'{host}:{port}'}")
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, server.close)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if ledger is not None:
+            ledger.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched multi-player slot session server")
+    parser.add_argument("command", choices=["serve", "loadtest"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--unix", default=None, help="serve on / connect to a Unix socket")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--ledger", default=None, help="append every spin to this ledger file")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--spins", type=int, default=200, help="spins per load-test player")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port or 8765, args.unix, args.seed, args.ledger))
+    else:
+        asyncio.run(load_test(args.clients, args.spins, args.host, args.port or 0,
+                              args.unix, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from paylines import PaylineEvaluator, load_paylines, standard_paylines
+from slot_machine import (COLS, MAX_LINES, ROWS, check_winnings, get_reel_model,
+                          get_slot_machine_spin, symbol_count, symbol_value)
+
+BATCH_SIZE = 1_000_000
+Z_95 = 1.959963984540054
+
+
+def build_values(names, values):
+    return np.array([values[name] for name in names], dtype=np.int64)
+
+
+def evaluate_batch(grids, lines, bet, values):
+    # Work line-major so every comparison runs over contiguous spins.
+    first = grids[:, 0, :lines].T
+    hits = np.ones(first.shape, dtype=bool)
+    for col in range(1, grids.shape[1]):
+        hits &= grids[:, col, :lines].T == first
+    payouts = np.where(hits, values[first], 0).sum(axis=0) * bet
+    return payouts, hits.T
+
+
+class RunningStats:
+    def __init__(self, lines):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.hit_count = 0
+        self.line_hits = np.zeros(lines, dtype=np.int64)
+        self.histogram = np.zeros(1, dtype=np.int64)
+
+    def update(self, payouts, hits):
+        # Payouts are small integers, so the histogram carries the exact
+        # mean and M2 of the batch without a second pass over the data.
+        batch = RunningStats(len(self.line_hits))
+        batch.histogram = np.bincount(payouts)
+        batch.count = len(payouts)
+        if batch.count:
+            support = np.arange(len(batch.histogram))
+            batch.mean = float(support @ batch.histogram) / batch.count
+            batch.m2 = float(((support - batch.mean) ** 2) @ batch.histogram)
+        batch.hit_count = int(np.count_nonzero(hits.any(axis=1)))
+        batch.line_hits = np.count_nonzero(hits, axis=0).astype(np.int64)
+        self.merge(batch)
+
+    def merge(self, other):
+        # Chan et al. pairwise combination of count/mean/M2.
+        count = self.count + other.count
+        if count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.hit_count += other.hit_count
+        self.line_hits = self.line_hits + other.line_hits
+        size = max(len(self.histogram), len(other.histogram))
+        histogram = np.zeros(size, dtype=np.int64)
+        histogram[:len(self.histogram)] += self.histogram
+        histogram[:len(other.histogram)] += other.histogram
+        self.histogram = histogram
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+def simulate(spins, lines=MAX_LINES, bet=1, rows=ROWS, cols=COLS,
+             symbols=symbol_count, values=symbol_value, seed=None,
+             batch_size=BATCH_SIZE, paylines=None):
+    model = get_reel_model(rows, cols, symbols)
+    value_table = build_values(model.names, values)
+    evaluator = None
+    if paylines is not None:
+        evaluator = PaylineEvaluator(paylines[:lines], rows, cols, value_table)
+    rng = np.random.default_rng(seed)
+    stats = RunningStats(lines)
+    remaining = spins
+    while remaining > 0:
+        n = min(batch_size, remaining)
+        grids = model.spin_batch(n, rng)
+        if evaluator is None:
+            payouts, hits = evaluate_batch(grids, lines, bet, value_table)
+        else:
+            payouts, hits = evaluator.evaluate(grids, bet=bet)
+        stats.update(payouts, hits)
+        remaining -= n
+    return stats
+
+
+def resolve_paylines(spec):
+    # None keeps the machine's horizontal lines; "standard:5x3:20" generates
+    # a layout; anything else is a payline JSON file.
+    if spec is None:
+        return ROWS, COLS, None
+    if spec.startswith("standard:"):
+        _, layout, count = spec.split(":")
+        cols, rows = map(int, layout.split("x"))
+        return rows, cols, standard_paylines(rows, cols, int(count))
+    return load_paylines(spec)
+
+
+def proportion_interval(successes, trials, z=Z_95):
+    if trials == 0:
+        return 0.0, 0.0, 0.0
+    p = successes / trials
+    half = z * math.sqrt(p * (1 - p) / trials)
+    return p, max(p - half, 0.0), min(p + half, 1.0)
+
+
+def summarize(stats, lines, bet, z=Z_95):
+    total_bet = lines * bet
+    rtp = stats.mean / total_bet
+    half = z * math.sqrt(stats.variance / stats.count) / total_bet if stats.count else 0.0
+    return {
+        "spins": stats.count,
+        "lines": lines,
+        "bet": bet,
+        "rtp": rtp,
+        "rtp_ci": (rtp - half, rtp + half),
+        "payout_variance": stats.variance,
+        "return_std": math.sqrt(stats.variance) / total_bet,
+        "hit_frequency": proportion_interval(stats.hit_count, stats.count, z),
+        "line_hit_rates": [proportion_interval(int(h), stats.count, z) for h in stats.line_hits],
+        "payouts": {payout: int(count) for payout, count in enumerate(stats.histogram) if count},
+    }
+
+
+def print_report(report):
+    print(f"Spins: {report['spins']:,} ({report['lines']} lines at £{report['bet']})")
+    low, high = report["rtp_ci"]
+    print(f"RTP: {report['rtp']:.6%} (95% CI {low:.6%} - {high:.6%})")
+    print(f"Payout variance: {report['payout_variance']:.6f}")
+    print(f"Return std dev per spin: {report['return_std']:.6f}")
+    p, low, high = report["hit_frequency"]
+    print(f"Hit frequency: {p:.6%} (95% CI {low:.6%} - {high:.6%})")
+    for line, (p, low, high) in enumerate(report["line_hit_rates"], start=1):
+        print(f"Line {line} hit rate: {p:.6%} (95% CI {low:.6%} - {high:.6%})")
+
+
+def python_loop(spins, lines=MAX_LINES, bet=1):
+    total = 0
+    for _ in range(spins):
+        slots = get_slot_machine_spin(ROWS, COLS, symbol_count)
+        winnings, _ = check_winnings(slots, lines, bet, symbol_value)
+        total += winnings
+    return total
+
+
+def compare_speed(spins, lines=MAX_LINES, bet=1, seed=None):
+    python_spins = min(spins, 200_000)
+    start = time.perf_counter()
+    python_loop(python_spins, lines, bet)
+    python_rate = python_spins / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    simulate(spins, lines, bet, seed=seed)
+    numpy_rate = spins / (time.perf_counter() - start)
+
+    print(f"Pure Python: {python_rate:,.0f} spins/s")
+    print(f"NumPy batches: {numpy_rate:,.0f} spins/s")
+    print(f"Speed-up: {numpy_rate / python_rate:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Monte Carlo RTP simulator for slot_machine.py")
+    parser.add_argument("--spins", type=int, default=10_000_000)
+    parser.add_argument("--lines", type=int, default=None)
+    parser.add_argument("--bet", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--paylines", default=None,
+                        help="JSON payline file, or 'standard:COLSxROWS:COUNT'")
+    parser.add_argument("--compare", action="store_true",
+                        help="time the NumPy engine against the pure-Python spin loop")
+    args = parser.parse_args()
+
+    rows, cols, paylines = resolve_paylines(args.paylines)
+    max_lines = MAX_LINES if paylines is None else len(paylines)
+    lines = args.lines or max_lines
+    if not 1 <= lines <= max_lines:
+        parser.error(f"--lines must be between 1 and {max_lines}")
+
+    if args.compare:
+        if paylines is not None:
+            parser.error("--compare only covers the built-in machine")
+        compare_speed(args.spins, lines, args.bet, args.seed)
+        return
+
+    start = time.perf_counter()
+    stats = simulate(args.spins, lines, args.bet, rows, cols, seed=args.seed,
+                     batch_size=args.batch_size, paylines=paylines)
+    elapsed = time.perf_counter() - start
+    print_report(summarize(stats, lines, args.bet))
+    print(f"Elapsed: {elapsed:.2f}s ({args.spins / elapsed:,.0f} spins/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import argparse
+import time
+
+from tetris_engine import (FULL_ROW, GRID_HEIGHT, GRID_WIDTH, KICKS, ROTATIONS, DOWN, DROP, HOLD, LEFT, RIGHT,
+                           ROTATE, TetrisEngine)
+
+# Board features a placement is scored on, in the order weight vectors use.
+FEATURES = ('height', 'lines', 'holes', 'bumpiness')
+DEFAULT_WEIGHTS = (-0.510066, 0.760666, -0.35663, -0.184483)
+
+# The board is searched as one int: row y occupies bits (y + TOP) * GRID_WIDTH
+# upwards, with TOP empty rows above the playfield for kicks that lift a
+# piece over the top.
+TOP = 4
+CACHE_LIMIT = 200_000
+NEIGHBOURS = FULL_ROW >> 1  # bit x: columns x and x + 1
+
+
+def board_int(rows):
+    board = 0
+    for y, row in enumerate(rows):
+        board |= row << ((y + TOP) * GRID_WIDTH)
+    return board
+
+
+def piece_ints():
+    # For every shape and rotation: the piece as one int at x = 0, y = 0,
+    # and for each of its columns the lowest filled row (for drop heights).
+    table = []
+    for rotations in ROTATIONS:
+        forms = []
+        for form in rotations:
+            mask = 0
+            for i, row in enumerate(form.masks):
+                mask |= row << (i * GRID_WIDTH)
+            bottoms = tuple(max(y for x, y in form.cells if x == column) for column in range(form.width))
+            forms.append((mask, form.width, form.height, bottoms))
+        table.append(tuple(forms))
+    return tuple(table)
+
+
+PIECES = piece_ints()
+
+
+def free_positions(board, shape_id):
+    # For each rotation and column x, an int with bit y + TOP set where the
+    # piece fits with its top-left corner at (x, y). Every other question
+    # the search asks (can it move, where does it land) is a bit test on
+    # these.
+    table = []
+    # The highest filled row, in bit rows; everything above it is empty.
+    stack = ((board & -board).bit_length() - 1) // GRID_WIDTH if board else GRID_HEIGHT + TOP
+    for mask, width, height, _ in PIECES[shape_id]:
+        last = GRID_HEIGHT - height + TOP
+        sky = min(stack - height, last)  # the piece fits anywhere down to here
+        columns = []
+        for x in range(GRID_WIDTH - width + 1):
+            shifted = mask << x
+            bits = (1 << (sky + 1)) - 1
+            for bit in range(sky + 1, last + 1):
+                if not board & (shifted << (bit * GRID_WIDTH)):
+                    bits |= 1 << bit
+            columns.append(bits)
+        table.append(columns)
+    return table
+
+
+def rotations_from(free, rotation, x, bits):
+    # Where a clockwise turn takes the piece from each of the positions in
+    # bits: like TetrisEngine.rotate, the first wall kick that fits wins.
+    turned = (rotation + 1) % 4
+    columns = free[turned]
+    for dx, dy in KICKS[turned]:
+        if not bits:
+            break
+        column = x + dx
+        if not 0 <= column < len(columns):
+            continue
+        fits = columns[column]
+        moved = bits & (fits >> dy if dy >= 0 else fits << -dy)
+        if moved:
+            bits &= ~moved
+            yield turned, column, moved << dy if dy >= 0 else moved >> -dy
+
+
+def reachable(free, rotation, x, y):
+    # Every (rotation, x, y) the piece can lock in from where it is, moving
+    # the way TetrisEngine.step does: shifts, soft and hard drops, and
+    # clockwise turns with the engine's wall kicks. Works on whole columns
+    # of positions at once: reach[rotation][x] is a set of y bits.
+    start = 1 << (y + TOP)
+    if y < -TOP or x < 0 or x >= len(free[rotation]) or not free[rotation][x] & start:
+        return []
+    reach = [[0] * len(columns) for columns in free]
+    reach[rotation][x] = start
+    pending = [(rotation, x)]
+    while pending:
+        rotation, x = pending.pop()
+        columns, reached = free[rotation], reach[rotation]
+        fits = columns[x]
+        bits = reached[x]
+        # Falling: each bit spreads upward through its run of free positions.
+        bits = reached[x] = (((fits + bits) ^ fits) & fits) | bits
+        for column in (x - 1, x + 1):
+            if 0 <= column < len(columns):
+                moved = bits & columns[column]
+                if moved & ~reached[column]:
+                    reached[column] |= moved
+                    pending.append((rotation, column))
+        for turned, column, moved in rotations_from(free, rotation, x, bits):
+            if moved & ~reach[turned][column]:
+                reach[turned][column] |= moved
+                pending.append((turned, column))
+    placements = []
+    for rotation, (columns, reached) in enumerate(zip(free, reach)):
+        for x, (fits, bits) in enumerate(zip(columns, reached)):
+            locked = bits & ~(fits >> 1)
+            while locked:
+                low = locked & -locked
+                placements.append((rotation, x, low.bit_length() - 1 - TOP))
+                locked ^= low
+    return placements
+
+
+def direct_path(free, start, target):
+    # Turn at the start row, slide across, hard drop: how most placements
+    # are reached. None if that does not end at target.
+    rotation, x, y = start
+    path = []
+    while rotation != target[0]:
+        turns = list(rotations_from(free, rotation, x, 1 << (y + TOP)))
+        if not turns:
+            return None
+        rotation, x, moved = turns[0]
+        y = moved.bit_length() - 1 - TOP
+        path.append(ROTATE)
+    columns = free[rotation]
+    step = 1 if target[1] > x else -1
+    while x != target[1]:
+        if not columns[x + step] >> (y + TOP) & 1:
+            return None
+        x += step
+        path.append(RIGHT if step == 1 else LEFT)
+    blocked = ~columns[x] >> (y + TOP + 1)
+    if y + (blocked & -blocked).bit_length() - 1 != target[2]:
+        return None
+    return tuple(path) + (DROP,)
+
+
+def path_to(free, start, target):
+    # The actions that take the piece from start to lock at target: a
+    # breadth-first search, so hard drops are used wherever they get there.
+    direct = direct_path(free, start, target)
+    if direct is not None:
+        return direct
+    paths = {start: ()}
+    queue = [start]
+    for state in queue:
+        rotation, x, y = state
+        path = paths[state]
+        if state == target:
+            return path + (DROP,)
+        bit = y + TOP
+        fits = free[rotation][x]
+        blocked = ~fits >> (bit + 1)
+        landing = y + (blocked & -blocked).bit_length() - 1
+        if (rotation, x, landing) == target:
+            return path + (DROP,)
+        moves = [(action, (rotation, column, y)) for action, column in ((LEFT, x - 1), (RIGHT, x + 1))
+                 if 0 <= column < len(free[rotation]) and free[rotation][column] >> bit & 1]
+        if landing > y:
+            moves.append((DOWN, (rotation, x, y + 1)))
+        for turned, column, moved in rotations_from(free, rotation, x, 1 << bit):
+            moves.append((ROTATE, (turned, column, moved.bit_length() - 1 - TOP)))
+        for action, next_state in moves:
+            if next_state not in paths:
+                paths[next_state] = path + (action,)
+                queue.append(next_state)
+    return None
+
+
+def place(rows, shape_id, rotation, x, y):
+    # The rows after locking the piece there, with full rows cleared, and
+    # the number of lines cleared; None if any of it would be above the top.
+    if y < 0:
+        return None, 0
+    rows = list(rows)
+    lines = 0
+    for i, mask in enumerate(ROTATIONS[shape_id][rotation].masks):
+        row = rows[y + i] = rows[y + i] | mask << x
+        if row == FULL_ROW:
+            lines += 1
+    if lines:
+        rows = [0] * lines + [row for row in rows if row != FULL_ROW]
+    return tuple(rows), lines
+
+
+def features(rows):
+    # Walking down the rows with seen = every column filled at or above
+    # this row: a column's height is the number of rows it is seen in,
+    # holes are seen cells that are empty, and two neighbouring columns
+    # differ in height by the number of rows where only one is seen.
+    seen = height = filled = bumpiness = 0
+    for row in rows:
+        seen |= row
+        if seen:
+            height += seen.bit_count()
+            filled += row.bit_count()
+            bumpiness += ((seen ^ (seen >> 1)) & NEIGHBOURS).bit_count()
+    return height, height - filled, bumpiness
+
+
+def drop_placements(rows, shape_id):
+    # Lookahead pieces are only tried as straight drops from above the
+    # stack: for each rotation and column, the landing row follows from
+    # the column tops alone.
+    tops = [GRID_HEIGHT] * GRID_WIDTH
+    seen = 0
+    for y, row in enumerate(rows):
+        new = row & ~seen
+        while new:
+            low = new & -new
+            tops[low.bit_length() - 1] = y
+            new ^= low
+        seen |= row
+    placements = []
+    seen_cells = set()
+    for rotation, (mask, width, height, bottoms) in enumerate(PIECES[shape_id]):
+        for x in range(GRID_WIDTH - width + 1):
+            y = min(tops[x + i] - bottom for i, bottom in enumerate(bottoms)) - 1
+            if (mask, x, y) in seen_cells:
+                continue
+            seen_cells.add((mask, x, y))
+            placements.append((rotation, x, y))
+    return placements
+
+
+class Player:
+    # Picks a placement for the current piece (or the hold piece) by
+    # scoring the boards it leads to: a weighted sum of FEATURES, with the
+    # lines cleared along the way, looking `lookahead` pieces further into
+    # next_pieces. Only the `beam` best first moves are looked ahead from.
+    # Board scores are cached across moves, since the boards a lookahead
+    # visits come round again as real positions.
+    def __init__(self, weights=DEFAULT_WEIGHTS, lookahead=1, beam=2):
+        self.weights = tuple(weights)
+        self.lookahead = lookahead
+        self.beam = beam
+        self.cache = {}
+
+    def score(self, rows, lines):
+        value = self.cache.get(rows)
+        if value is None:
+            if len(self.cache) >= CACHE_LIMIT:
+                self.cache.clear()
+            height, holes, bumpiness = features(rows)
+            w_height, _, w_holes, w_bumpiness = self.weights
+            value = self.cache[rows] = w_height * height + w_holes * holes + w_bumpiness * bumpiness
+        return value + self.weights[1] * lines
+
+    def best_after(self, rows, upcoming):
+        # The best score reachable by dropping each upcoming piece in turn.
+        if not upcoming:
+            return 0.0
+        key = (rows, upcoming)
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        best = float('-inf')
+        for rotation, x, y in drop_placements(rows, upcoming[0]):
+            after, lines = place(rows, upcoming[0], rotation, x, y)
+            if after is None:
+                continue
+            if len(upcoming) == 1:
+                value = self.score(after, lines)
+            else:
+                value = self.weights[1] * lines + self.best_after(after, upcoming[1:])
+            best = max(best, value)
+        self.cache[key] = best
+        return best
+
+    def options(self, engine):
+        # (hold first?, shape, rotation, x, y, pieces still to come) for the
+        # piece that would be placed without holding and with it.
+        piece = engine.current_piece
+        upcoming = tuple(next_piece.shape_id for next_piece in engine.next_pieces)
+        yield False, piece.shape_id, piece.rotation, piece.x, piece.y, upcoming
+        if not engine.can_hold:
+            return
+        held = engine.hold_piece
+        if held is not None:
+            x = GRID_WIDTH // 2 - held.form.width // 2
+            yield True, held.shape_id, held.rotation, x, 0, upcoming
+        else:
+            first = engine.next_pieces[0]
+            yield True, first.shape_id, first.rotation, first.x, first.y, upcoming[1:]
+
+    def choose(self, engine):
+        # The actions that carry out the best placement, or None if the
+        # piece cannot be placed at all.
+        rows = tuple(engine.rows)
+        board = board_int(rows)
+        candidates = []
+        for hold, shape_id, rotation, x, y, upcoming in self.options(engine):
+            free = free_positions(board, shape_id)
+            seen = set()
+            for placement in reachable(free, rotation, x, y):
+                after, lines = place(rows, shape_id, *placement)
+                if after is not None and after not in seen:
+                    seen.add(after)
+                    candidates.append((self.score(after, lines), lines, after, upcoming,
+                                       (hold, free, (rotation, x, y), placement)))
+        if not candidates:
+            return None
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        choice = candidates[0][4]
+        if self.lookahead:
+            best = float('-inf')
+            for value, lines, after, upcoming, move in candidates[:self.beam]:
+                value = self.weights[1] * lines + self.best_after(after, upcoming[:self.lookahead])
+                if value > best:
+                    best, choice = value, move
+        hold, free, start, placement = choice
+        return ((HOLD,) if hold else ()) + path_to(free, start, placement)
+
+
+def play_game(seed, player=None, max_pieces=1000):
+    engine = TetrisEngine(seed)
+    player = player or Player()
+    while not engine.game_over and engine.pieces_placed < max_pieces:
+        actions = player.choose(engine)
+        if actions is None:
+            break
+        for action in actions:
+            engine.step(action)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Let the Tetris AI play headless games")
+    parser.add_argument('--games', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pieces', type=int, default=500, help="stop each game after this many pieces")
+    parser.add_argument('--lookahead', type=int, default=1)
+    parser.add_argument('--beam', type=int, default=2)
+    args = parser.parse_args()
+
+    player = Player(lookahead=args.lookahead, beam=args.beam)
+    pieces = 0
+    start = time.perf_counter()
+    for game in range(args.games):
+        engine = play_game(args.seed + game, player, args.pieces)
+        pieces += engine.pieces_placed
+        print(f"game {game}: {engine.pieces_placed} pieces, {engine.lines_cleared} lines, score {engine.score}"
+              f"{' (topped out)' if engine.game_over else ''}")
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed / pieces * 1000:.2f} ms per piece")
+
+
+if __name__ == "__main__":
+    main()
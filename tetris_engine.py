@@ -0,0 +1,337 @@
+import argparse
+import random
+import time
+
+# Colors
+BLACK = (0, 0, 0)
+CYAN = (0, 255, 255)
+YELLOW = (255, 255, 0)
+MAGENTA = (255, 0, 255)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+ORANGE = (255, 165, 0)
+
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+FULL_ROW = (1 << GRID_WIDTH) - 1
+
+# Tetromino shapes
+SHAPES = [
+    [[1, 1, 1, 1]],
+    [[1, 1], [1, 1]],
+    [[1, 1, 1], [0, 1, 0]],
+    [[1, 1, 1], [1, 0, 0]],
+    [[1, 1, 1], [0, 0, 1]],
+    [[1, 1, 0], [0, 1, 1]],
+    [[0, 1, 1], [1, 1, 0]]
+]
+
+COLORS = [CYAN, YELLOW, MAGENTA, RED, GREEN, BLUE, ORANGE]
+
+DEFAULT_SPEED = 5
+
+# Actions for TetrisEngine.step; TICK is one step of gravity.
+LEFT, RIGHT, DOWN, ROTATE, DROP, HOLD, TICK = 'left', 'right', 'down', 'rotate', 'drop', 'hold', 'tick'
+ACTIONS = (LEFT, RIGHT, DOWN, ROTATE, DROP, HOLD, TICK)
+
+
+# Wall-kick offsets to try, indexed by the rotation just turned into.
+KICKS = (
+    ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),
+    ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2)),
+    ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),
+    ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),
+)
+
+
+class Rotation:
+    # One orientation of one shape. Built once per shape and rotation in
+    # ROTATIONS and never changed; pieces, drawing and bots all share them.
+    __slots__ = ('shape', 'masks', 'cells', 'width', 'height')
+
+    def __init__(self, shape):
+        self.shape = tuple(tuple(row) for row in shape)
+        # One int per shape row, bit x set where column x is filled.
+        self.masks = tuple(sum(1 << x for x, cell in enumerate(row) if cell) for row in self.shape)
+        self.cells = tuple((x, y) for y, row in enumerate(self.shape) for x, cell in enumerate(row) if cell)
+        self.width = len(self.shape[0])
+        self.height = len(self.shape)
+
+
+def rotation_table(shapes):
+    table = []
+    for shape in shapes:
+        rotations = []
+        for _ in range(4):
+            rotations.append(Rotation(shape))
+            shape = list(zip(*shape[::-1]))  # clockwise
+        table.append(tuple(rotations))
+    return tuple(table)
+
+
+ROTATIONS = rotation_table(SHAPES)
+
+
+class Tetromino:
+    # A piece is its shape id, rotation and position; form is just
+    # ROTATIONS[shape_id][rotation], so turning it allocates nothing.
+    __slots__ = ('shape_id', 'rotation', 'form', 'color', 'x', 'y')
+
+    def __init__(self, shape_id=None, rng=random):
+        self.shape_id = rng.randrange(len(SHAPES)) if shape_id is None else shape_id
+        self.color = rng.choice(COLORS)
+        self.rotation = 0
+        self.form = ROTATIONS[self.shape_id][0]
+        self.x = GRID_WIDTH // 2 - self.form.width // 2
+        self.y = 0
+
+    @property
+    def shape(self):
+        return self.form.shape
+
+    @property
+    def cells(self):
+        return self.form.cells
+
+    def move(self, dx, dy):
+        self.x += dx
+        self.y += dy
+
+    def rotate(self):
+        self.rotation = (self.rotation + 1) % 4
+        self.form = ROTATIONS[self.shape_id][self.rotation]
+
+    def undo_rotate(self):
+        self.rotation = (self.rotation - 1) % 4
+        self.form = ROTATIONS[self.shape_id][self.rotation]
+
+
+class TetrisEngine:
+    # The rules of the game with no display: TetrisGame draws it, bots and
+    # replays drive it through step(). Everything random comes from
+    # self.rng, so a seed and a list of actions reproduce a game exactly.
+    # The playfield is kept twice: self.rows is a bitboard, one int per row
+    # with bit x set where column x is filled, for collisions and line
+    # clears; self.grid holds each cell's colour for drawing.
+    def __init__(self, seed=None, record=False, speed=DEFAULT_SPEED):
+        self.seed = seed
+        self.record = record
+        self.game_speed = speed
+        self.reset_game()
+
+    def reset_game(self):
+        self.rng = random.Random(self.seed)
+        self.actions = []
+        self.grid = [[BLACK for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+        self.rows = [0] * GRID_HEIGHT
+        self.bag = self.generate_bag()
+        self.current_piece = self.get_next_piece()
+        self.next_pieces = [self.get_next_piece() for _ in range(3)]
+        self.hold_piece = None
+        self.can_hold = True
+        self.game_over = False
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.pieces_placed = 0
+        self.combo = 0
+        self.last_move_was_tetris = False
+
+    def generate_bag(self):
+        bag = list(range(len(SHAPES)))
+        self.rng.shuffle(bag)
+        return bag
+
+    def get_next_piece(self):
+        if not self.bag:
+            self.bag = self.generate_bag()
+        return Tetromino(self.bag.pop(), self.rng)
+
+    def check_collision(self, piece, dx=0, dy=0):
+        form = piece.form
+        x = piece.x + dx
+        if x < 0 or x + form.width > GRID_WIDTH:
+            return True
+        y = piece.y + dy
+        if y + form.height > GRID_HEIGHT:
+            return True
+        rows = self.rows
+        for i, mask in enumerate(form.masks):
+            if y + i >= 0 and rows[y + i] & (mask << x):
+                return True
+        return False
+
+    def merge_piece(self):
+        piece = self.current_piece
+        for i, mask in enumerate(piece.form.masks):
+            self.rows[piece.y + i] |= mask << piece.x
+        for x, y in piece.form.cells:
+            self.grid[piece.y + y][piece.x + x] = piece.color
+
+    def remove_full_rows(self):
+        # Only the rows the last piece landed in can have filled up.
+        top = max(self.current_piece.y, 0)
+        full_rows = [y for y in range(top, top + self.current_piece.form.height) if self.rows[y] == FULL_ROW]
+        if full_rows:
+            kept = [y for y in range(GRID_HEIGHT) if self.rows[y] != FULL_ROW]
+            empty = len(full_rows)
+            self.rows = [0] * empty + [self.rows[y] for y in kept]
+            self.grid = [[BLACK for _ in range(GRID_WIDTH)] for _ in range(empty)] + [self.grid[y] for y in kept]
+
+        lines_cleared = len(full_rows)
+        self.lines_cleared += lines_cleared
+        self.update_score(lines_cleared)
+
+        self.level = self.lines_cleared // 10 + 1
+        self.game_speed = min(DEFAULT_SPEED + self.level - 1, 20)
+        return lines_cleared
+
+    def update_score(self, lines_cleared):
+        line_scores = [100, 300, 500, 800]
+        if lines_cleared > 0:
+            score = line_scores[lines_cleared - 1] * self.level
+            if lines_cleared == 4:
+                if self.last_move_was_tetris:
+                    score *= 1.5  # Back-to-back Tetris bonus
+                self.last_move_was_tetris = True
+            else:
+                self.last_move_was_tetris = False
+
+            self.combo += 1
+            score += (50 * self.combo * self.level)  # Combo bonus
+
+            self.score += int(score)
+        else:
+            self.combo = 0
+            self.last_move_was_tetris = False
+
+    def lock_piece(self):
+        self.merge_piece()
+        lines = self.remove_full_rows()
+        self.pieces_placed += 1
+        self.new_piece()
+        return lines
+
+    def drop_distance(self, piece):
+        # How far piece would fall; the ghost piece, hard drop and bots use it.
+        distance = 0
+        while not self.check_collision(piece, 0, distance + 1):
+            distance += 1
+        return distance
+
+    def hard_drop(self):
+        self.current_piece.y += self.drop_distance(self.current_piece)
+        return self.lock_piece()
+
+    def hold(self):
+        if self.can_hold:
+            if self.hold_piece:
+                self.hold_piece, self.current_piece = self.current_piece, self.hold_piece
+                self.current_piece.x = GRID_WIDTH // 2 - self.current_piece.form.width // 2
+                self.current_piece.y = 0
+            else:
+                self.hold_piece = self.current_piece
+                self.new_piece()
+            self.can_hold = False
+
+    def new_piece(self):
+        self.current_piece = self.next_pieces.pop(0)
+        self.next_pieces.append(self.get_next_piece())
+        if self.check_collision(self.current_piece):
+            self.game_over = True
+        self.can_hold = True
+
+    def wall_kick(self, piece, rotation):
+        for dx, dy in KICKS[rotation]:
+            if not self.check_collision(piece, dx, dy):
+                piece.x += dx
+                piece.y += dy
+                return True
+        return False
+
+    def rotate(self):
+        self.current_piece.rotate()
+        if self.check_collision(self.current_piece):
+            if not self.wall_kick(self.current_piece, self.current_piece.rotation):
+                self.current_piece.undo_rotate()
+
+    def step(self, action):
+        # Applies one action and returns the number of lines it cleared.
+        if self.game_over:
+            return 0
+        if self.record:
+            self.actions.append(action)
+        piece = self.current_piece
+        if action == LEFT:
+            if not self.check_collision(piece, -1, 0):
+                piece.move(-1, 0)
+        elif action == RIGHT:
+            if not self.check_collision(piece, 1, 0):
+                piece.move(1, 0)
+        elif action == DOWN:
+            if not self.check_collision(piece, 0, 1):
+                piece.move(0, 1)
+        elif action == ROTATE:
+            self.rotate()
+        elif action == DROP:
+            return self.hard_drop()
+        elif action == HOLD:
+            self.hold()
+        elif action == TICK:
+            if not self.check_collision(piece, 0, 1):
+                piece.move(0, 1)
+            else:
+                return self.lock_piece()
+        else:
+            raise ValueError(f"Unknown action: {action}")
+        return 0
+
+
+def replay(seed, actions):
+    engine = TetrisEngine(seed)
+    for action in actions:
+        engine.step(action)
+    return engine
+
+
+def validate_replay(seed, actions, score, lines_cleared):
+    engine = replay(seed, actions)
+    return engine.score == score and engine.lines_cleared == lines_cleared
+
+
+def random_game(seed, max_pieces=10_000):
+    # A cheap stand-in player: random shifts and turns, then a hard drop.
+    engine = TetrisEngine(seed)
+    moves = random.Random(seed)
+    while not engine.game_over and engine.pieces_placed < max_pieces:
+        for _ in range(moves.randrange(4)):
+            engine.step(ROTATE)
+        shift = moves.randrange(-5, 6)
+        for _ in range(abs(shift)):
+            engine.step(LEFT if shift < 0 else RIGHT)
+        engine.step(DROP)
+    return engine
+
+
+def benchmark(games, seed=0):
+    start = time.perf_counter()
+    pieces = 0
+    for game in range(games):
+        pieces += random_game(seed + game).pieces_placed
+    elapsed = time.perf_counter() - start
+    return games / elapsed, pieces / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Tetris engine benchmark")
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    games_per_second, pieces_per_second = benchmark(args.games, args.seed)
+    print(f"{games_per_second:,.0f} games/s, {pieces_per_second:,.0f} pieces/s (random play)")
+
+
+if __name__ == "__main__":
+    main()
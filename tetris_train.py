@@ -0,0 +1,158 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from tetris_ai import DEFAULT_WEIGHTS, FEATURES, Player, play_game
+
+# Genetic tuning of the AI's feature weights. Every candidate in a
+# generation plays the same games (the same generate_bag seeds), so their
+# fitness differs only by their weights, and a run with the same settings
+# and seed always evolves the same way, on any number of workers.
+CHECKPOINT = 'tetris_population.json'
+
+
+def normalize(weights):
+    # Only the direction of a weight vector changes which move wins.
+    norm = math.sqrt(sum(weight * weight for weight in weights)) or 1.0
+    return [weight / norm for weight in weights]
+
+
+def random_weights(rng):
+    return normalize([rng.uniform(-1, 1) for _ in FEATURES])
+
+
+def play(task):
+    weights, seed, max_pieces, lookahead = task
+    # CPU time rather than wall time, so the per-core rate stays honest
+    # when there are more workers than cores.
+    start = time.process_time()
+    engine = play_game(seed, Player(weights, lookahead=lookahead), max_pieces)
+    return engine.lines_cleared, engine.pieces_placed, time.process_time() - start
+
+
+def game_seeds(seed, generation, games):
+    return [seed * 1_000_003 + generation * games + i for i in range(games)]
+
+
+def evaluate(pool, workers, population, seeds, max_pieces, lookahead):
+    # Mean lines cleared per candidate, plus the game count and the CPU time
+    # the workers spent playing (for the per-core rate).
+    tasks = [(weights, seed, max_pieces, lookahead) for weights in population for seed in seeds]
+    if pool is None:
+        results = list(map(play, tasks))
+    else:
+        results = list(pool.map(play, tasks, chunksize=max(1, len(tasks) // (workers * 8))))
+    fitness = []
+    for i in range(len(population)):
+        games = results[i * len(seeds):(i + 1) * len(seeds)]
+        fitness.append(sum(lines for lines, _, _ in games) / len(games))
+    busy = sum(elapsed for _, _, elapsed in results)
+    return fitness, len(results), busy
+
+
+def tournament(ranked, rng, size):
+    return max(rng.sample(ranked, min(size, len(ranked))), key=lambda entry: entry[0])
+
+
+def next_generation(population, fitness, rng, elite=2, tournament_size=4, mutation_rate=0.2, mutation_scale=0.2):
+    # The best few carry over unchanged; the rest are crossovers of two
+    # tournament winners, weighted by their fitness, with some genes nudged.
+    ranked = sorted(zip(fitness, population), key=lambda entry: entry[0], reverse=True)
+    children = [list(weights) for _, weights in ranked[:elite]]
+    while len(children) < len(population):
+        (fit_a, a), (fit_b, b) = tournament(ranked, rng, tournament_size), tournament(ranked, rng, tournament_size)
+        share = fit_a / (fit_a + fit_b) if fit_a + fit_b > 0 else 0.5
+        child = [share * x + (1 - share) * y for x, y in zip(a, b)]
+        for i in range(len(child)):
+            if rng.random() < mutation_rate:
+                child[i] += rng.gauss(0, mutation_scale)
+        children.append(normalize(child))
+    return children
+
+
+def save_checkpoint(path, state):
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(temp, path)
+
+
+def load_checkpoint(path):
+    with open(path, 'r') as f:
+        state = json.load(f)
+    version, internal, gauss = state['rng']
+    state['rng'] = (version, tuple(internal), gauss)
+    return state
+
+
+def train(generations, size=20, games=8, max_pieces=500, lookahead=0, seed=0, workers=None,
+          checkpoint=CHECKPOINT, resume=False):
+    workers = workers or os.cpu_count()
+    if resume and os.path.exists(checkpoint):
+        state = load_checkpoint(checkpoint)
+        rng = random.Random()
+        rng.setstate(state['rng'])
+        generation, population, best = state['generation'], state['population'], state['best']
+        # The games have to be the same ones the run started with.
+        settings = state['settings']
+        games, max_pieces, lookahead, seed = (settings[key] for key in ('games', 'max_pieces', 'lookahead', 'seed'))
+        print(f"Resuming at generation {generation} from {checkpoint}")
+    else:
+        rng = random.Random(seed)
+        generation, best = 0, None
+        population = [normalize(DEFAULT_WEIGHTS)] + [random_weights(rng) for _ in range(size - 1)]
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while generation < generations:
+            start = time.perf_counter()
+            fitness, played, busy = evaluate(pool, workers, population, game_seeds(seed, generation, games),
+                                             max_pieces, lookahead)
+            elapsed = time.perf_counter() - start
+            top = max(range(len(population)), key=fitness.__getitem__)
+            if best is None or fitness[top] > best['fitness']:
+                best = {'fitness': fitness[top], 'weights': population[top], 'generation': generation}
+            print(f"gen {generation:3d}: best {fitness[top]:7.1f} mean {sum(fitness) / len(fitness):7.1f} lines | "
+                  f"{played / elapsed:6.1f} games/s on {workers} worker(s), {played / busy:5.2f} games/s per core | "
+                  + " ".join(f"{name}={weight:+.3f}" for name, weight in zip(FEATURES, population[top])))
+            population = next_generation(population, fitness, rng)
+            generation += 1
+            save_checkpoint(checkpoint, {
+                'generation': generation,
+                'population': population,
+                'best': best,
+                'rng': rng.getstate(),
+                'settings': {'size': size, 'games': games, 'max_pieces': max_pieces,
+                             'lookahead': lookahead, 'seed': seed},
+            })
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the Tetris AI's weights with a genetic algorithm")
+    parser.add_argument('--generations', type=int, default=10)
+    parser.add_argument('--size', type=int, default=20, help="candidates per generation")
+    parser.add_argument('--games', type=int, default=8, help="games per candidate per generation")
+    parser.add_argument('--pieces', type=int, default=500, help="stop each game after this many pieces")
+    parser.add_argument('--lookahead', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--checkpoint', default=CHECKPOINT)
+    parser.add_argument('--resume', action='store_true', help="carry on from the checkpoint")
+    args = parser.parse_args()
+
+    best = train(args.generations, args.size, args.games, args.pieces, args.lookahead, args.seed,
+                 args.workers, args.checkpoint, args.resume)
+    print(f"Best: {best['fitness']:.1f} lines (generation {best['generation']}) with weights "
+          + ", ".join(f"{weight:.6f}" for weight in best['weights']))
+
+
+if __name__ == "__main__":
+    main()